@@ -2,7 +2,7 @@ from dataclasses import dataclass
 import logging
 from pygame import Vector2
 
-from robot_war.exceptions import BlockGenerator
+from robot_war.signals import BlockGenerator
 from robot_war.vm.api_class import RobotApi
 from robot_war.vm.source_module import Module
 
@@ -35,7 +35,7 @@ class Robot(RobotApi):
             finally:
                 self._turning = False
 
-        raise BlockGenerator(turn())
+        return BlockGenerator(turn())
 
     def forward(self, distance):
         LOG.warning("forward(%f)", distance)
@@ -54,7 +54,7 @@ class Robot(RobotApi):
             finally:
                 self._moving = False
 
-        raise BlockGenerator(move())
+        return BlockGenerator(move())
 
     def shoot(self, distance):
         LOG.warning("shoot(%f)", distance)
@@ -76,7 +76,7 @@ class Robot(RobotApi):
             finally:
                 self._shooting = False
 
-        raise BlockGenerator(shot())
+        return BlockGenerator(shot())
 
 
 MODEL0_MODULE = Module("model0", name_dict={"Robot": Robot})
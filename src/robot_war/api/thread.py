@@ -1,25 +1,25 @@
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Optional, Tuple
 
 from robot_war.vm.api_class import Waiter, ApiClass, requires_sandbox
-from robot_war.vm.source_class import SourceInstance
 from robot_war.vm.source_module import Module
 
 try:
     from robot_war.vm.exec_context import SandBox
-    from robot_war.vm.source_functions import Function
+    from robot_war.vm.source_functions import Function, FunctionCreator
 except ImportError:
-    SandBox = Function = None  # type: ignore
+    SandBox = Function = FunctionCreator = None  # type: ignore
 
 
 @dataclass
-class Thread(ApiClass, SourceInstance):
+class Thread(ApiClass):
     _sandbox: Optional["SandBox"] = None
     _running: bool = False
     _waiter: Waiter = field(default_factory=Waiter)
+    _priority: int = 1
 
     def __post_init__(self):
-        self.name_dict = {"join": self.join, "start": self.start}
+        self.name_dict = {"join": self.join, "set_priority": self.set_priority, "start": self.start}
 
     @property
     def running(self):
@@ -30,31 +30,43 @@ class Thread(ApiClass, SourceInstance):
         assert sandbox
         return self._waiter.get_value(sandbox)
 
+    def set_priority(self, priority: int) -> "Thread":
+        """Each turn, our thread runs priority times as many instructions as a thread of priority 1"""
+        if priority < 1:
+            raise ValueError("priority must be at least 1")
+        self._priority = int(priority)
+        if self._sandbox:
+            self._sandbox.priority = self._priority
+        return self
+
     def start(self, function: "Function", *args, **kwargs) -> "Thread":
         assert self._playground and not self._running
         self._running = True
 
-        arguments = {"_set_value": self._waiter.set_value, "_func": function}
-        for index, arg in enumerate(args):
-            arguments[f"_arg{index}"] = arg
-        arguments.update(kwargs)
-        from robot_war.vm.source_functions import Function
-        with Function("thread_wrapper", arguments=arguments) as wrapper:
+        from robot_war.vm.source_functions import trampoline
+        wrapper = trampoline(("thread_wrapper", len(args), tuple(kwargs)),
+                             lambda: self.build_wrapper(len(args), tuple(kwargs)))
+        self._sandbox = self._playground.new_sandbox(
+            wrapper, self._waiter.set_value, function, *args, *kwargs.values())
+        self._sandbox.priority = self._priority
+
+        return self
+
+    @staticmethod
+    def build_wrapper(num_args: int, named_args: Tuple[str, ...]) -> "FunctionCreator":
+        """Build a function that calls _func with its arguments and hands the result to _set_value"""
+        from robot_war.vm.source_functions import FunctionCreator
+        arg_names = [f"_arg{index}" for index in range(num_args)]
+        with FunctionCreator("thread_wrapper", ["_set_value", "_func"] + arg_names + list(named_args)) as wrapper:
             wrapper.LOAD_FAST("_set_value")
             wrapper.LOAD_FAST("_func")
-            for index in range(len(args)):
-                wrapper.LOAD_FAST(f"_arg{index}")
-            named_args = []
-            for name, value in kwargs.items():
+            for name in arg_names + list(named_args):
                 wrapper.LOAD_FAST(name)
-                named_args.append(name)
-            wrapper.LOAD_CONST(repr(tuple(named_args)))
-            wrapper.CALL_FUNCTION_KW(len(args) + len(named_args))  # Call thread function
+            wrapper.LOAD_CONST(named_args)
+            wrapper.CALL_FUNCTION_KW(num_args + len(named_args))  # Call thread function
             wrapper.CALL_FUNCTION(1)  # Call set_value() with the result
             wrapper.RETURN_VALUE()
-        self._sandbox = self._playground.new_sandbox(wrapper)
-
-        return self
+        return wrapper
 
 
 THREAD_MODULE = Module("thread", name_dict={"Thread": Thread})
@@ -1,7 +1,7 @@
 import logging
 from time import monotonic
 
-from robot_war.exceptions import BlockGenerator
+from robot_war.signals import BlockTimer
 from robot_war.vm.source_module import Module
 
 # Constants:
@@ -9,13 +9,8 @@ LOG = logging.getLogger(__name__)
 
 
 def sleep(delay: float):
-    wake_at = monotonic() + delay
-
-    def poll_time():
-        while monotonic() < wake_at:
-            yield
-
-    raise BlockGenerator(poll_time())
+    """Sleep for delay seconds of game time, which passes a tick at a time, however fast the host is"""
+    return BlockTimer(delay)
 
 
 TIME_MODULE = Module("time", name_dict={"monotonic": monotonic, "sleep": sleep})
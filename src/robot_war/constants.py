@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 import sys
 
@@ -8,6 +9,24 @@ class CONSTANTS:
     class TIMING:
         FRAME_RATE = 30
         FRAMES = 1.0 / FRAME_RATE
+        MAX_SKIPPED_FRAMES = 5  # most frames in a row we skip rendering to catch up with the clock
+        SMOOTHING = 0.1  # how much each new paint, flip and VM time moves the frame pacer's averages
+        MIN_VM_TIME = 0.1 * FRAMES  # the least time the robots get per frame, however slow rendering is
+
+    class VM:
+        QUANTUM = 100  # instructions a thread runs per turn before the scheduler moves on
+        FUEL_PER_TICK = 20000  # instructions, weighted by cost, a robot runs per tick unless its model says otherwise
+        FRAME_POOL_SIZE = 64  # most frames a Playground keeps around for reuse
+        CALL_SITE_SIZE = 4  # most types of callee a call instruction remembers how to call
+
+    class IMPORTS:
+        REFRESH_SECONDS = 1.0  # how long the import index trusts a directory listing before checking it changed
+        LAZY = False  # whether Playgrounds run an imported module's code only once something first looks in it
+
+    class CODE_CACHE:
+        MAX_BYTES = 64 * 1024 * 1024  # past this, the least recently used scripts are evicted
+        MAX_SCRIPTS = 1024  # most compiled scripts kept in memory
+        MAX_CODE_BLOCKS = 16384  # most decoded code blocks kept in memory, and the same again of undecoded instructions
 
     class PATHS:
         SCRIPTS = Path(sys.executable).parent
@@ -15,6 +34,7 @@ class CONSTANTS:
         ROBOT_IMAGE = ROOT / "assets" / "robot1.png"
         FIREBALL_IMAGE = ROOT / "assets" / "fireball1.png"
         SOURCE = ROOT / "src" / "robot_war"
+        CODE_CACHE = Path(os.environ.get("ROBOT_WAR_CACHE", Path.home() / ".cache" / "robot_war"))  # per user
 
         class TEST:
             EXTERNALS = Path(__file__).parents[2] / "test" / "externals"
@@ -1,5 +1,7 @@
 import pygame
+from time import monotonic, sleep
 
+from robot_war.game_engine.pacing import FramePacer
 from robot_war.game_engine.sprites import Sprites
 
 
@@ -7,24 +9,33 @@ class GameEngine:
     def __init__(self, video_size):
         pygame.init()
         self.screen = pygame.display.set_mode(video_size)
-        self.clock = pygame.time.Clock()
+        self.pacer = FramePacer()
         self.sprites = Sprites()
 
     def loop(self):
         ui_running = True
+        pacer = self.pacer
         while ui_running:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     ui_running = False
 
-            self.paint_ui()
-            pygame.display.flip()
-            self.backend()
+            if pacer.start_frame(monotonic()):
+                start = monotonic()
+                self.paint_ui()
+                painted = monotonic()
+                pygame.display.flip()
+                pacer.rendered(painted - start, monotonic() - painted)
+
+            start = monotonic()
+            self.backend(pacer.vm_budget())
+            pacer.stepped(monotonic() - start)
+            sleep(pacer.end_frame(monotonic()))
 
         pygame.quit()
 
     def paint_ui(self):
         pass
 
-    def backend(self):
-        self.clock.tick(60)
+    def backend(self, max_time: float):
+        """Advance the game one tick, taking no longer than max_time"""
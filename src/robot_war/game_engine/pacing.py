@@ -0,0 +1,91 @@
+"""
+Frame pacing: how each frame's time is split between rendering and running the robots. We keep moving averages of how
+long painting, flipping and running the VM take. The VM gets whatever is left of the frame once rendering is paid for.
+When the simulation falls more than a frame behind the clock, we skip rendering to catch up. We only skip up to
+CONSTANTS.TIMING.MAX_SKIPPED_FRAMES frames in a row, so that the screen still updates on a host that can't keep up.
+If we fall further behind than that, we drop the lost time rather than trying to make it up.
+"""
+
+from dataclasses import dataclass
+import logging
+from typing import Dict, Optional
+
+from robot_war.constants import CONSTANTS
+
+# Constants:
+LOG = logging.getLogger(__name__)
+
+
+@dataclass
+class FramePacer:
+    frame_time: float = CONSTANTS.TIMING.FRAMES
+    max_skipped: int = CONSTANTS.TIMING.MAX_SKIPPED_FRAMES
+    smoothing: float = CONSTANTS.TIMING.SMOOTHING  # how much each new measurement moves the averages
+    min_vm_time: float = CONSTANTS.TIMING.MIN_VM_TIME  # the VM always gets this much, however slow rendering is
+
+    # Moving averages, in seconds
+    paint_time: float = 0.0
+    flip_time: float = 0.0
+    vm_time: float = 0.0
+
+    # Decisions
+    next_frame: Optional[float] = None  # monotonic() time the next frame is due
+    lag: float = 0.0  # how far behind the clock the current frame started
+    rendering: bool = True  # whether the current frame is rendered
+    skipped_in_a_row: int = 0
+    frames: int = 0
+    frames_skipped: int = 0
+    time_dropped: float = 0.0  # time we fell too far behind to make up
+
+    def average(self, average: float, measurement: float) -> float:
+        return average + (measurement - average) * self.smoothing
+
+    def start_frame(self, now: float) -> bool:
+        """Start a frame. Returns whether to render it."""
+        if self.next_frame is None:
+            self.next_frame = now
+        self.lag = max(now - self.next_frame, 0.0)
+        self.frames += 1
+        self.rendering = self.lag < self.frame_time or self.skipped_in_a_row >= self.max_skipped
+        if self.rendering:
+            self.skipped_in_a_row = 0
+        else:
+            self.skipped_in_a_row += 1
+            self.frames_skipped += 1
+        return self.rendering
+
+    def rendered(self, paint_time: float, flip_time: float):
+        self.paint_time = self.average(self.paint_time, paint_time)
+        self.flip_time = self.average(self.flip_time, flip_time)
+
+    def vm_budget(self) -> float:
+        """How long the VM may run this frame: the whole frame, less what rendering it is likely to take"""
+        render_time = self.paint_time + self.flip_time if self.rendering else 0.0
+        return max(self.frame_time - render_time, self.min_vm_time)
+
+    def stepped(self, vm_time: float):
+        self.vm_time = self.average(self.vm_time, vm_time)
+
+    def end_frame(self, now: float) -> float:
+        """Finish the frame. Returns how long to wait before starting the next one."""
+        assert self.next_frame is not None, "end_frame() before start_frame()"
+        self.next_frame += self.frame_time
+        behind = now - self.next_frame
+        if behind > self.frame_time * (self.max_skipped + 1):
+            LOG.debug("%.1f ms behind: giving up on catching up", behind * 1000.0)
+            self.time_dropped += behind
+            self.next_frame = now
+        return max(self.next_frame - now, 0.0)
+
+    def metrics(self) -> Dict[str, float]:
+        """What we measured and decided, for display or logging. Times are in milliseconds."""
+        return {
+            "paint_ms": self.paint_time * 1000.0,
+            "flip_ms": self.flip_time * 1000.0,
+            "vm_ms": self.vm_time * 1000.0,
+            "vm_budget_ms": self.vm_budget() * 1000.0,
+            "lag_ms": self.lag * 1000.0,
+            "frames": self.frames,
+            "frames_skipped": self.frames_skipped,
+            "dropped_ms": self.time_dropped * 1000.0
+        }
@@ -4,7 +4,7 @@ import pygame
 from typing import Optional, List
 
 from robot_war.constants import CONSTANTS
-from robot_war.exceptions import BlockGenerator
+from robot_war.signals import BlockGenerator
 from robot_war.game_engine.base_game_engine import GameEngine
 from robot_war.game_engine.sprites import Sprite
 from robot_war.vm.api_class import ApiClass
@@ -49,17 +49,21 @@ class RWEngine(GameEngine):
     next_frame_time: float = 0
 
     def __init__(self, video_size):
+        # Compile the robot's scripts before the display is open: preloading starts a pool of processes
+        self.playground = ThreadGround(USER_SCRIPT.parent, game_engine=self)
+        self.playground.preload(USER_SCRIPT)
+
         super().__init__(video_size)
         self.robot_image = pygame.transform.scale_by(pygame.image.load(CONSTANTS.PATHS.ROBOT_IMAGE), 0.25)
         self.fireball_image = pygame.transform.scale_by(pygame.image.load(CONSTANTS.PATHS.FIREBALL_IMAGE), 0.2)
 
         # Note that call_function doesn't block while the program runs. It loads a program into the VM and the execution
         # must be advanced by steps in backend()
-        self.playground = ThreadGround(USER_SCRIPT, game_engine=self)
         sandbox = SandBox(self.playground)
-        self.playground.sandboxes = [sandbox]
+        self.playground.scheduler.wake(sandbox)
         self.workers: List[BlockGenerator] = []  # type: ignore[annotation-unchecked]
         module = Module("__main__")
+        self.playground.all_modules["__main__"] = module
         # TODO: Check if there's an __init__.py first? Not sure if that's right. Should test.
         sandbox.call_function(module.read_source_file(USER_SCRIPT))
         self.user_running = True
@@ -68,9 +72,8 @@ class RWEngine(GameEngine):
         self.screen.fill("slateblue4")
         self.sprites.draw(self.screen)
 
-    def backend(self):
-        self.playground.step_all(CONSTANTS.TIMING.FRAMES)
-        self.clock.tick(CONSTANTS.TIMING.FRAME_RATE)
+    def backend(self, max_time: float):
+        self.playground.step_all(max_time)
 
     def create_sprite(self, image: pygame.Surface, position: pygame.Vector2, facing: float) -> Sprite:
         return self.sprites.add(Sprite(image, pygame.Vector2(position), facing))
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from typing import Generator, Optional
+
+try:
+    from robot_war.vm.api_class import Waiter
+    from robot_war.vm.exec_context import SandBox
+except ImportError:
+    Waiter = SandBox = None  # type: ignore
+
+# Signals are how the VM tells its interpreter loop that something other than "carry on with the next instruction"
+# happened. They are returned, not raised: raising and unwinding a Python exception on every function return or robot
+# motion command is far too slow. Instruction handlers return None to carry on, or one of these:
+#   * FRAME_CHANGED: a function was called or returned, so SandBox.run() must reload the current frame
+#   * DONE: the sandbox's outermost function returned
+#   * BlockGenerator, BlockFunction or BlockTimer: the sandbox can't continue until the scheduler wakes it up
+# Native (API) functions called from the VM may also return FRAME_CHANGED or a block signal instead of a value.
+
+
+class Signal:
+    """Base class for everything the VM returns instead of raising"""
+
+
+class FrameChanged(Signal):
+    """Returned when a function pushed or popped a frame and will push its own return value"""
+
+
+class Done(Signal):
+    """Returned when a sandbox's outermost function has returned"""
+
+
+class BlockBase(Signal):
+    pass
+
+
+@dataclass
+class BlockGenerator(BlockBase):
+    generator: Generator
+    sandbox: Optional["SandBox"] = None
+
+
+@dataclass
+class BlockFunction(BlockBase):
+    waiter: "Waiter"
+
+
+@dataclass
+class BlockTimer(BlockBase):
+    delay: float  # seconds of game time: see Scheduler.time
+
+
+FRAME_CHANGED = FrameChanged()
+DONE = Done()
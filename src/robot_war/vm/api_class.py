@@ -3,7 +3,8 @@ import logging
 from pygame import Vector2
 from typing import Optional, Any, List, Callable
 
-from robot_war.exceptions import BlockFunction, SandboxRequired
+from robot_war.constants import CONSTANTS
+from robot_war.signals import BlockFunction
 from robot_war.vm.get_name import GetName
 
 try:
@@ -30,6 +31,7 @@ class ApiClass(GetName):
 class RobotApi(ApiClass):
     position: Vector2 = Vector2(300.0, 200.0)
     facing: float = 0.0
+    _fuel_per_tick: int = CONSTANTS.VM.FUEL_PER_TICK  # models override this to give their robots more or less CPU
 
 
 @dataclass
@@ -47,7 +49,7 @@ class Waiter:
         while self.sandboxes:
             sandbox = self.sandboxes.pop()
             sandbox.push(self.value)  # return value
-            sandbox.playground.sandboxes.append(sandbox)  # continue
+            sandbox.playground.scheduler.wake(sandbox)  # continue
 
     def get_value(self, sandbox: "SandBox"):
         """Any thread may call this method, may block, but will eventually get a value"""
@@ -56,13 +58,10 @@ class Waiter:
         else:
             # The thread isn't done, so block until they're ready
             self.sandboxes.append(sandbox)
-            raise BlockFunction(self)
+            return BlockFunction(self)
 
 
 def requires_sandbox(function: Callable):
-    def wrapper(*args, **kwargs):
-        if "sandbox" not in kwargs:
-            raise SandboxRequired()
-        return function(*args, **kwargs)
-
-    return wrapper
+    """Mark an API function as needing the calling sandbox: SandBox.call_function() passes it in as keyword sandbox"""
+    function.requires_sandbox = True  # type: ignore[attr-defined]
+    return function
@@ -1,10 +1,16 @@
 import logging
 
 from robot_war.exceptions import RobotWarSystemExit
+from robot_war.vm.api_class import requires_sandbox
+
+try:
+    from robot_war.vm.exec_context import SandBox
+except ImportError:
+    SandBox = None  # type: ignore
 
 
 def is_class(user_cls, cls) -> bool:
-    return (user_cls is cls) or any(is_class(parent, cls) for parent in user_cls.parent_classes)
+    return id(cls) in user_cls.ancestor_ids
 
 
 def rw_isinstance(obj, cls) -> bool:
@@ -15,8 +21,12 @@ def rw_isinstance(obj, cls) -> bool:
         return isinstance(obj, cls)
 
 
-def rw_hasattr(obj, name: str) -> bool:
-    if hasattr(obj, "get_attr"):
+@requires_sandbox
+def rw_hasattr(obj, name: str, sandbox: "SandBox"):
+    from robot_war.vm.source_module import LazyModule
+    if type(obj) is LazyModule:
+        return obj.load_and_call(sandbox, rw_hasattr, name)
+    elif hasattr(obj, "get_attr"):
         try:
             obj.get_attr(name)
             return True
@@ -26,8 +36,12 @@ def rw_hasattr(obj, name: str) -> bool:
         return hasattr(obj, name)
 
 
-def rw_getattr(obj, name: str):
-    if hasattr(obj, "get_attr"):
+@requires_sandbox
+def rw_getattr(obj, name: str, sandbox: "SandBox"):
+    from robot_war.vm.source_module import LazyModule
+    if type(obj) is LazyModule:
+        return obj.load_and_call(sandbox, rw_getattr, name)
+    elif hasattr(obj, "get_attr"):
         return getattr(obj, "get_attr")(name)
     else:
         return getattr(obj, name)
@@ -35,6 +49,6 @@ def rw_getattr(obj, name: str):
 
 BUILT_INS = {
     "getattr": rw_getattr, "hasattr": rw_hasattr, "IndexError": IndexError, "int": int, "isinstance": rw_isinstance,
-    "IOError": IOError, "list": list, "print": print, "range": range, "str": str, "SystemExit": RobotWarSystemExit,
-    "ZeroDivisionError": ZeroDivisionError
+    "IOError": IOError, "list": list, "NameError": NameError, "print": print, "range": range, "str": str,
+    "SystemExit": RobotWarSystemExit, "UnboundLocalError": UnboundLocalError, "ZeroDivisionError": ZeroDivisionError
 }
@@ -0,0 +1,192 @@
+"""
+A cache of compiled and decoded robot scripts on disk, so that the same scripts aren't compiled and decoded again at
+the start of every match. Each entry holds a script's code object and the instruction tables of all the code in it,
+marshalled into one file named for a hash of the script's source, its file name, the interpreter's byte code version,
+and our own FORMAT. Change any of those and the entry is simply never found again; unreadable entries are deleted.
+Entries are written to a temporary file and renamed into place, so a reader never sees half an entry. Reading an entry
+touches it, and when the cache grows past its size limit the least recently used entries go first. Entries we've
+already compiled or loaded are kept in memory too, so every Playground in the process gets the very same code. At
+match setup, preload() fills the cache for a robot's whole package tree in parallel, before any of its code runs.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from hashlib import sha256
+from importlib.util import MAGIC_NUMBER
+import logging
+import marshal
+from multiprocessing import get_context
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from robot_war.constants import CONSTANTS, CODE_CLASS
+from robot_war.vm.lru_dict import LRUDict
+from robot_war.vm.source_module import Instructions, decode_instructions
+
+# Constants:
+LOG = logging.getLogger(__name__)
+FORMAT = 1  # bump this whenever decoding changes: entries from older versions of the VM are then ignored
+SUFFIX = ".rwc"
+
+
+def nested_code(code: CODE_CLASS) -> Iterator[CODE_CLASS]:  # type: ignore[valid-type]
+    """Yields code and all the code nested inside it, in a fixed order"""
+    yield code
+    for constant in code.co_consts:  # type: ignore[attr-defined]
+        if isinstance(constant, CODE_CLASS):
+            yield from nested_code(constant)
+
+
+def build_entry(source_code: str, file_name: str) -> bytes:
+    """Compile and decode source code into a cache entry"""
+    code = compile(source_code, file_name, "exec")
+    instructions = tuple(decode_instructions(nested) for nested in nested_code(code))
+    return marshal.dumps((FORMAT, code, instructions))
+
+
+def preload_entry(source_code: str, file_name: str) -> Optional[bytes]:
+    """build_entry() for preload()'s pool: scripts that don't compile are left for their import to report"""
+    try:
+        return build_entry(source_code, file_name)
+    except SyntaxError:
+        return None
+
+
+def read_entry(data: bytes) -> Tuple[Any, Dict[Any, Instructions]]:
+    """Returns the code and the decoded instructions in a cache entry; raises ValueError, etc., if it isn't one"""
+    cache_format, code, instructions = marshal.loads(data)
+    if cache_format != FORMAT or not isinstance(code, CODE_CLASS):
+        raise ValueError("not a code cache entry")
+    all_code = list(nested_code(code))
+    if len(all_code) != len(instructions):
+        raise ValueError("code and instructions don't match")
+    return code, dict(zip(all_code, instructions))
+
+
+def find_scripts(*paths: Path) -> Iterator[Path]:
+    """Yields the scripts in and under each directory in paths, and each script in paths"""
+    for path in paths:
+        if path.is_dir():
+            for script in path.rglob("*.py"):
+                if not any(part.startswith((".", "__pycache__"))
+                           for part in script.relative_to(path).parts):
+                    yield script
+        elif path.suffix == ".py":
+            yield path
+
+
+@dataclass
+class CodeCache:
+    directory: Path
+    max_bytes: int
+    loaded: Dict[str, Tuple[Any, Dict[Any, Instructions]]] = field(  # by key, for this process
+        default_factory=lambda: LRUDict(CONSTANTS.CODE_CACHE.MAX_SCRIPTS))
+
+    @staticmethod
+    def entry_name(source_code: str, file_name: str) -> str:
+        key = sha256(b"\0".join([MAGIC_NUMBER, str(FORMAT).encode(), file_name.encode(), source_code.encode()]))
+        return f"{key.hexdigest()}{SUFFIX}"
+
+    def compile(self, source_code: str, file_name: str) -> Tuple[Any, Dict[Any, Instructions]]:
+        """Returns the compiled source code, and the decoded instructions of all the code in it"""
+        name = self.entry_name(source_code, file_name)
+        cached = self.loaded.get(name)
+        if cached is None:
+            cached = self.load(self.directory / name)
+        if cached is None:
+            data = build_entry(source_code, file_name)
+            self.save(self.directory / name, data)
+            self.evict()
+            cached = read_entry(data)
+        self.loaded[name] = cached
+        return cached
+
+    def preload(self, scripts: Iterable[Path], max_workers: Optional[int] = None) -> int:
+        """
+        Compile and decode scripts ready for compile(): those that aren't cached yet, in a pool of processes. Returns
+        how many scripts that was.
+        """
+        missing: Dict[str, Tuple[str, str]] = {}  # entry name -> (source code, file name)
+        for script in scripts:
+            try:
+                source_code = script.read_text()
+            except (OSError, UnicodeDecodeError):
+                continue  # the error is reported when the module is imported
+            name = self.entry_name(source_code, str(script))
+            if name in self.loaded or name in missing:
+                continue
+            cached = self.load(self.directory / name)
+            if cached is None:
+                missing[name] = (source_code, str(script))
+            else:
+                self.loaded[name] = cached
+        if not missing:
+            return 0
+
+        source_codes, file_names = zip(*missing.values())
+        if len(missing) == 1:
+            self.add_entries(missing, [preload_entry(source_codes[0], file_names[0])])
+        else:
+            # Spawn rather than fork: the host may have a display or other threads that a forked copy mustn't inherit
+            with ProcessPoolExecutor(max_workers, mp_context=get_context("spawn")) as pool:
+                self.add_entries(missing, pool.map(preload_entry, source_codes, file_names))
+        self.evict()
+        return len(missing)
+
+    def add_entries(self, names: Iterable[str], entries: Iterable[Optional[bytes]]):
+        for name, data in zip(names, entries):
+            if data is not None:
+                self.save(self.directory / name, data)
+                self.loaded[name] = read_entry(data)
+
+    @staticmethod
+    def load(path: Path) -> Optional[Tuple[Any, Dict[Any, Instructions]]]:
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+
+        try:
+            cached = read_entry(data)
+        except (EOFError, TypeError, ValueError):
+            LOG.warning("Discarding unreadable code cache entry %s", path)
+            path.unlink(missing_ok=True)
+            return None
+
+        try:
+            os.utime(path)  # most recently used
+        except OSError:
+            pass
+        return cached
+
+    def save(self, path: Path, data: bytes):
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            temp_path.write_bytes(data)
+            os.replace(temp_path, path)
+        except OSError as exc:
+            # A cache we can't write to only costs us time
+            LOG.warning("Unable to save code cache entry %s: %s", path, exc)
+            temp_path.unlink(missing_ok=True)
+
+    def evict(self):
+        """Delete the least recently used entries until we're back under our size limit"""
+        entries = []
+        for path in self.directory.glob(f"*{SUFFIX}"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # another process evicted it
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+CODE_CACHE = CodeCache(CONSTANTS.PATHS.CODE_CACHE, CONSTANTS.CODE_CACHE.MAX_BYTES)
@@ -5,247 +5,352 @@ from time import monotonic
 from typing import List, Any, Dict, Optional, Union
 
 from robot_war.api import ROBOT_CLASSES, API_CLASSES
-from robot_war.exceptions import (DontPushReturnValue, TerminalError, BlockBase, RobotWarSystemExit, BlockGenerator,
-                                  BlockFunction, SandboxRequired)
+from robot_war.constants import CONSTANTS
+from robot_war.exceptions import TerminalError, RobotWarSystemExit
+from robot_war.signals import Signal, FRAME_CHANGED, DONE
 from robot_war.vm.api_class import ApiClass
 from robot_war.vm.get_name import GetName
+from robot_war.vm.import_index import ImportIndex, import_index
+from robot_war.vm.instructions.data import UNBOUND
 from robot_war.vm.instructions.except_handling import WithOffset, TryOffset, VMException
-from robot_war.vm.instructions.flow_control import ReturnException
-from robot_war.vm.source_class import SourceClass, SourceInstance, BoundMethod, Constructor
+from robot_war.vm.scheduler import Scheduler
+from robot_war.vm.source_class import SourceClass, SourceInstance, BoundMethod
 from robot_war.vm.source_functions import Function
 from robot_war.vm.source_module import Module
 
 # Types:
 NameDict = Dict[str, Any]
+NameSpace = Union[GetName, SourceInstance, None]  # what a frame looks up its names in
 
 # Constants:
 LOG = logging.getLogger(__name__)
-CODE_STEP = 2
+NO_LOCALS: List[Any] = []  # never written to: functions without locals don't store any
 
 # FunctionContext knows about execution through a single function. Sandbox knows about the execution of a single thread
 # and all the nested function calls. A Playground knows all the threads for a given robot. If a player has multiple
 # robots operating simultaneously, they will have multiple Playground objects
 
 
-@dataclass
 class FunctionContext:
-    function: Function
-    fast_stack: Dict[int, Any] = field(default_factory=dict)
-    get_name_obj: Optional[GetName] = None
-    deref: Dict[int, Any] = field(default_factory=dict)
-    data_stack: List[Any] = field(default_factory=list)
-    pc: int = 0
-    try_stack: List[Union[TryOffset, WithOffset]] = field(default_factory=list)
+    """
+    A frame: the state of one function call. Frames are recycled through the Playground's frame pool rather than
+    allocated for every call, which is why this is a __slots__ class set up by init() instead of a dataclass.
+    """
+    __slots__ = ("function", "fast_stack", "get_name_obj", "deref", "data_stack", "pc", "try_stack", "constructs")
+
+    def __init__(self, function: Function, fast_stack: List[Any], get_name_obj: NameSpace = None):
+        self.deref: List[Any] = []
+        self.data_stack: List[Any] = []
+        self.try_stack: List[Union[TryOffset, WithOffset]] = []
+        self.init(function, fast_stack, get_name_obj)
+
+    def __repr__(self):
+        return f"FunctionContext({self.function.name}, pc={self.pc})"
+
+    def init(self, function: Function, fast_stack: List[Any], get_name_obj: NameSpace):
+        self.function = function
+        self.fast_stack = fast_stack  # local variables, sized from the code block and indexed like the byte code does
+        self.get_name_obj = get_name_obj
+        self.pc = 0
+        self.constructs: Any = None  # a class or instance being created: returned in place of whatever we return
+
+        # Cell variables come first, then the values of the free variables we closed over. Parameters that are also
+        # cell variables start out with the argument's value.
+        code_block = function.code_block
+        if code_block.num_cells:
+            self.deref.extend([UNBOUND] * code_block.num_cells)
+            for cell_index, param_index in code_block.cell_params.items():
+                self.deref[cell_index] = fast_stack[param_index]
+        if function.closure:
+            self.deref.extend(function.closure)
+
+    def release(self):
+        """Drop everything the call referenced so that the frame can sit in the pool"""
+        self.fast_stack = NO_LOCALS
+        self.get_name_obj = None
+        self.constructs = None
+        self.deref.clear()
+        self.data_stack.clear()
+        self.try_stack.clear()
 
 
 @dataclass(repr=False)
 class Playground:
     root_path: Path
     all_modules: Dict[str, Module] = field(default_factory=dict)
-    sandboxes: List["SandBox"] = field(default_factory=list)
     robot: Optional[ApiClass] = None
-    workers: List[BlockGenerator] = field(default_factory=list)
+    scheduler: Scheduler = field(default_factory=Scheduler)
+    frame_pool: List[FunctionContext] = field(default_factory=list)  # shared by all our sandboxes
+    import_index: ImportIndex = field(init=False)
+    api_modules: Dict[str, Module] = field(default_factory=dict)  # our own copies of the native API modules
+    lazy_imports: bool = CONSTANTS.IMPORTS.LAZY
+    fuel_per_tick: int = CONSTANTS.VM.FUEL_PER_TICK
+    fuel: int = 0  # left over from the last tick: never more than 0, as only an overrun carries over
+
+    def __post_init__(self):
+        self.import_index = import_index(self.root_path)
+
+    def api_module(self, dot_path: str, module: Module) -> Module:
+        """
+        Returns our copy of a native API module. Code is shared by every Playground, but names aren't: each gets its own
+        namespace, so that one robot can't change a module under another.
+        """
+        copy = self.api_modules.get(dot_path)
+        if copy is None:
+            copy = self.api_modules[dot_path] = Module(module.name, name_dict=dict(module.name_dict), path=module.path,
+                                                       dot_path=module.dot_path)
+        return copy
+
+    def preload(self, *scripts: Path) -> int:
+        """
+        Match setup: compile and decode every script under our root path, and any other scripts given, in parallel, so
+        that importing them is quick. That takes in everything __main__ imports, statically or not, as imports resolve
+        to scripts under our root path. Returns how many weren't in the code cache already.
+        """
+        from robot_war.vm.code_cache import CODE_CACHE, find_scripts
+        return CODE_CACHE.preload(find_scripts(self.root_path, *scripts))
 
     def set_robot(self, robot: ApiClass):
+        """Our robot is built: its model can give it more or less fuel per tick"""
         self.robot = robot
+        self.fuel_per_tick = getattr(robot, "_fuel_per_tick", self.fuel_per_tick)
 
     def unset_robot(self):
         self.robot = None
 
     def __repr__(self):
-        return (f"Playground({str(self.root_path)}, {len(self.all_modules)} modules, {len(self.sandboxes)} sandboxes, "
-                f"{self.robot}")
-
-    def step_all(self, max_time: float = 0.0):
-        stop_after = monotonic() + max_time
-
-        index = 0
-        while index < len(self.workers):
-            worker = self.workers[index]
-            try:
-                next(worker.generator)
-            except StopIteration as stop:
-                assert worker.sandbox
-                worker.sandbox.push(stop.value)
-                del self.workers[index]
-                self.sandboxes.append(worker.sandbox)
-            else:
-                index += 1
-
-        while self.sandboxes:
-            index = 0
-            while index < len(self.sandboxes):
-                sandbox = self.sandboxes[index]
-                try:
-                    sandbox.step()
-                except ReturnException:
-                    del self.sandboxes[index]
-                except BlockGenerator as block_generator:
-                    block_generator.sandbox = sandbox
-                    del self.sandboxes[index]
-                    self.workers.append(block_generator)
-                except BlockFunction:
-                    del self.sandboxes[index]
-                else:
-                    index += 1
-
-            if monotonic() > stop_after:
+        scheduler = self.scheduler
+        return (f"Playground({str(self.root_path)}, {len(self.all_modules)} modules, {len(scheduler.ready)} ready, "
+                f"{len(scheduler.blocked) + len(scheduler.workers)} blocked, {self.robot}")
+
+    def step_all(self, max_time: Optional[float] = None):
+        """
+        Run one tick: wake the sleepers that are due, advance the workers once, then run rounds of the ready sandboxes
+        until they are all done or blocked, or the tick's fuel is burnt. Fuel counts instructions weighted by their
+        cost, and sleeps count ticks of game time (see Scheduler), so how much a robot gets done per tick doesn't depend
+        on the host, or on the other robots. max_time is a wall clock limit on top of that, as a safety net: a tick cut
+        short by it isn't reproducible.
+        """
+        scheduler = self.scheduler
+        scheduler.wake_timers()
+        scheduler.step_workers()
+        self.fuel = min(self.fuel, 0) + self.fuel_per_tick
+        stop_after = None if max_time is None else monotonic() + max_time
+        while scheduler.ready and self.fuel > 0:
+            self.fuel = scheduler.run_round(self.fuel)
+            if stop_after is not None and monotonic() > stop_after:
                 break
+            scheduler.wake_timers()
+        scheduler.time += CONSTANTS.TIMING.FRAMES
 
-    def new_sandbox(self, function: Function) -> "SandBox":
+    def new_sandbox(self, function: Function, *args) -> "SandBox":
         sandbox = SandBox(self)
-        self.sandboxes.append(sandbox)
-        function.call_in_sandbox(sandbox)
+        self.scheduler.wake(sandbox)
+        sandbox.call_function(function, *args)
         return sandbox
 
 
-@dataclass(repr=False)
+def call_path(callee_type: type):
+    """The SandBox method that calls callees of this type"""
+    if issubclass(callee_type, SourceClass):
+        return SandBox.call_class
+    if issubclass(callee_type, BoundMethod):
+        return SandBox.call_bound_method
+    if issubclass(callee_type, Function):
+        return SandBox.call_source_function
+    if issubclass(callee_type, type):
+        return SandBox.call_native_class
+    return SandBox.call_native
+
+
+@dataclass(repr=False, eq=False)
 class SandBox:
     playground: Playground
+    priority: int = 1  # turns run this many times the scheduler's quantum
     call_stack: List[FunctionContext] = field(default_factory=list)
     handling_exception: Optional[VMException] = None
     done: bool = False
+    return_value: Any = None  # what the outermost function returned
+    budget_left: int = 0  # what run() had left of its budget when it returned: less than 0 if the last op overran it
+    context: FunctionContext = field(init=False)  # top of call_stack, kept as a plain attribute for the handlers
+    frame_pool: List[FunctionContext] = field(init=False)
+
+    def __post_init__(self):
+        self.frame_pool = [] if self.playground is None else self.playground.frame_pool
+
+        # Logging every push and pop is expensive, so only use the logged versions when somebody is listening
+        if LOG.isEnabledFor(logging.DEBUG):
+            self.pop = self.logged_pop  # type: ignore[method-assign]
+            self.push = self.logged_push  # type: ignore[method-assign]
 
     def __repr__(self):
         return f"Sandbox({self.playground}, {len(self.call_stack)} call entries"
 
-    @property
-    def context(self) -> FunctionContext:
-        return self.call_stack[-1]
+    def push_frame(self, context: FunctionContext):
+        self.call_stack.append(context)
+        self.context = context
+
+    def pop_frame(self):
+        context = self.call_stack.pop()
+        if self.call_stack:
+            self.context = self.call_stack[-1]
+        if len(self.frame_pool) < CONSTANTS.VM.FRAME_POOL_SIZE:
+            context.release()
+            self.frame_pool.append(context)
+
+    def call_frame(self, function: Function, fast_stack: List[Any], get_name_obj: NameSpace) -> Signal:
+        """Push a frame to run function, recycling one from the frame pool if there is one"""
+        if self.frame_pool:
+            context = self.frame_pool.pop()
+            context.init(function, fast_stack, get_name_obj)
+        else:
+            context = FunctionContext(function, fast_stack, get_name_obj)
+        self.push_frame(context)
+        return FRAME_CHANGED
 
     @staticmethod
-    def args_to_fast(function: Function, *args, **kwargs) -> Dict[int, Any]:
-        # Initial placeholders
-        arg_list = [None] * function.code_block.num_params
-
-        # Default values
-        if function.default_args:
-            arg_list = arg_list[:-len(function.default_args)] + list(function.default_args)
-
-        # Specified values
-        arg_list = list(args) + arg_list[len(args):]
-
-        # Keyword arguments
-        for index, param_name in enumerate(function.code_block.param_names):
-            if param_name in kwargs:
-                arg_list[index] = kwargs[param_name]
-
-        return {index: value for index, value in enumerate(arg_list)}
+    def args_to_fast(function: Function, *args, **kwargs) -> List[Any]:
+        code_block = function.code_block
+        return (code_block.binding or code_block.binding_plan()).bind(args, kwargs, function.default_args)
 
     def call_function(self, function, *args, **kwargs):
-        if isinstance(function, SourceClass):
-            # Calling a class as a function instantiates an object
-            instance = SourceInstance({"__name__": function.module.name}, function)
-
-            try:
-                # But we can't just run the __init__ function as it will return None. We need to return the instance,
-                # so we create a little wrapper function to fix that up. We'll pass in parameters __init__, instance,
-                # and the arguments we received.
-                init_func = function.get_name("__init__")
-                fast_stack = self.args_to_fast(init_func, init_func, instance, *args, **kwargs)
-                num_args = len(fast_stack) - 1  # not counting init_func
-                arg_names = ["init_func", "instance"] + [f"arg{index}" for index in range(num_args - 1)]
-
-                # Create the wrapper function
-                with Function("__wrapper__", arg_names) as wrapper:
-                    # Load the parameters and call the __init__
-                    wrapper.LOAD_FAST("init_func")
-                    wrapper.LOAD_FAST("instance")
-                    for index in range(num_args - 1):
-                        wrapper.LOAD_FAST(f"arg{index}")
-                    wrapper.CALL_FUNCTION(num_args)
-
-                    # Discard __init__'s return value
-                    wrapper.POP_TOP()
-
-                    # Return our instance
-                    wrapper.LOAD_FAST("instance")
-                    wrapper.RETURN_VALUE()
-
-                closure = {index: value for index, value in enumerate(init_func.closure)}
-                self.call_stack.append(FunctionContext(wrapper, fast_stack, instance, closure))
-            except KeyError:
-                self.push(instance)  # No __init__()
-
-        elif isinstance(function, Constructor):
-            fast_stack = self.args_to_fast(function, *args, **kwargs)
-            closure = {index: value for index, value in enumerate(function.closure)}
-            self.call_stack.append(FunctionContext(function, fast_stack, function.source_class, closure))
-
-        elif isinstance(function, BoundMethod):
-            fast_stack = self.args_to_fast(function, function.instance, *args, **kwargs)
-            closure = {index: value for index, value in enumerate(function.closure)}
-            self.call_stack.append(FunctionContext(function, fast_stack, function.instance, closure))
-
-        elif isinstance(function, Function):
-            fast_stack = self.args_to_fast(function, *args, **kwargs)
-            closure = {index: value for index, value in enumerate(function.closure)}
-            self.call_stack.append(FunctionContext(function, fast_stack, function.code_block.module, closure))
-
-        elif function in API_CLASSES:
+        """
+        Call any kind of function. Native functions run right away and their return value is pushed, so we return None.
+        Functions written for the VM get a new frame and the return value is pushed when it returns, so we return
+        FRAME_CHANGED. Native functions may also return a signal of their own, for example to block this sandbox.
+        Call sites that see the same kinds of callee over and over skip this and use call_path() directly.
+        """
+        return call_path(type(function))(self, function, *args, **kwargs)
+
+    def call_class(self, function: SourceClass, *args, **kwargs):
+        # Calling a class as a function instantiates an object
+        instance = SourceInstance(function)
+        init_func = function.get_init()
+        if init_func is None:
+            self.push(instance)
+            return None
+
+        # __init__ returns None, but we need to return the instance: have its frame do that for us
+        fast_stack = self.args_to_fast(init_func, instance, *args, **kwargs)
+        self.call_frame(init_func, fast_stack, instance)
+        self.context.constructs = instance
+        return FRAME_CHANGED
+
+    def call_bound_method(self, function: BoundMethod, *args, **kwargs):
+        fast_stack = self.args_to_fast(function.function, function.instance, *args, **kwargs)
+        return self.call_frame(function.function, fast_stack, function.instance)
+
+    def call_source_function(self, function: Function, *args, **kwargs):
+        fast_stack = self.args_to_fast(function, *args, **kwargs)
+        return self.call_frame(function, fast_stack, function.module)
+
+    def call_native_class(self, function, *args, **kwargs):
+        if function in API_CLASSES:
             self.push(function(_playground=self.playground))
-
-        else:
-            assert function not in ROBOT_CLASSES, "Robot classes must be subclassed, do not instantiate as-is"
-
-            try:
-                self.push(function(*args, **kwargs))
-            except SandboxRequired:
-                kwargs["sandbox"] = self
-                self.call_function(function, *args, **kwargs)
-            except DontPushReturnValue:
-                pass
-
-    def step(self):
-        try:
+            return None
+
+        assert function not in ROBOT_CLASSES, "Robot classes must be subclassed, do not instantiate as-is"
+        return self.call_native(function, *args, **kwargs)
+
+    def call_native(self, function, *args, **kwargs):
+        if getattr(function, "requires_sandbox", False):
+            kwargs["sandbox"] = self
+        value = function(*args, **kwargs)
+        if isinstance(value, Signal):
+            return value
+        self.push(value)
+        return None
+
+    def run(self, budget: int) -> Optional[Signal]:
+        """
+        Execute up to budget instructions. The inner loop keeps the current frame in locals and only drops out to reload
+        it when an instruction signals that a function was called or returned, or when an exception is being handled.
+        Each instruction burns its fuel cost from the budget, which is checked between instructions only, so we always
+        stop cleanly. Returns None if we ran out of budget, DONE if the outermost function returned, or the signal that
+        blocked us, and leaves what was left of the budget in budget_left.
+        """
+        while budget > 0:
             context = self.context
-            instruction = context.function.code_block.code_lines[context.pc]
-            instruction.exec(self)
-            # self.context.function.code_block.code_lines[self.context.pc].exec(self)
-        except ReturnException as rc:
-            cs = self.call_stack.pop()
-            assert not cs.data_stack
-            # assert not self.call_stack.pop().data_stack, "Data stack wasn't empty"
-            if self.call_stack:
-                self.push(rc.value)
-            else:
-                self.done = True
-                raise
-        except BlockBase:
-            raise
-        except Exception as error:
-            # TODO: Exception in an exception handler
-            traceback = [(context.function, context.pc) for context in self.call_stack]
-            self.handling_exception = VMException(error, traceback)
-            self.next_except_handler()
-
-    def exec_through(self) -> int:
+            code_block = context.function.code_block
+            handlers = code_block.handlers
+            costs = code_block.costs
+            try:
+                while budget > 0:
+                    pc = context.pc
+                    context.pc = pc + 1
+                    budget -= costs[pc]
+                    signal = handlers[pc](self)
+                    if signal is not None:
+                        if signal is not FRAME_CHANGED:
+                            self.budget_left = budget
+                            return signal
+                        break
+            except Exception as error:
+                # TODO: Exception in an exception handler
+                traceback = [(context.function, context.pc) for context in self.call_stack]
+                self.handling_exception = VMException(error, traceback)
+                self.next_except_handler()
+        self.budget_left = budget
+        return None
+
+    def step(self) -> Optional[Signal]:
+        return self.run(1)
+
+    def exec_through(self) -> Any:
+        """Run this sandbox on its own until the outermost function returns, then return what it returned"""
         try:
-            while True:
-                self.step()
+            signal = self.run(CONSTANTS.VM.QUANTUM)
+            while signal is not DONE:
+                assert signal is None, "exec_through() can't wait for a blocked sandbox"
+                signal = self.run(CONSTANTS.VM.QUANTUM)
+            return self.return_value
         except RobotWarSystemExit as rc:
             return rc.return_code
         except VMException as error:
             raise error.exception
-        except ReturnException as rc:
-            return rc.value
 
-    def next(self):
-        self.context.pc += CODE_STEP
+    def return_from_function(self, value) -> Signal:
+        assert not self.context.data_stack, "Data stack wasn't empty"
+        if self.context.constructs is not None:
+            value = self.context.constructs
+        self.pop_frame()
+        if self.call_stack:
+            self.push(value)
+            return FRAME_CHANGED
+
+        self.done = True
+        self.return_value = value
+        return DONE
 
     def peek(self, offset: int):
         return self.context.data_stack[offset]
 
     def pop(self):
-        LOG.debug("    pop(%r)", self.peek(-1))
         return self.context.data_stack.pop()
 
     def push(self, value):
         self.context.data_stack.append(value)
+
+    def pop_many(self, count: int) -> List[Any]:
+        """Pop the top count values, returned in the order they were pushed"""
+        if not count:
+            return []
+        data_stack = self.context.data_stack
+        values = data_stack[-count:]
+        del data_stack[-count:]
+        return values
+
+    def logged_pop(self):
+        LOG.debug("    pop(%r)", self.peek(-1))
+        return self.context.data_stack.pop()
+
+    def logged_push(self, value):
+        self.context.data_stack.append(value)
         LOG.debug("    push(%r)", self.peek(-1))
 
     def build_class(self, function: Function, name: str, *parent_classes):
-        num_api_parents = len([cls for cls in parent_classes if cls in ROBOT_CLASSES])
+        # Only native classes can be API classes (source classes aren't hashable, so don't look them up)
+        num_api_parents = len([cls for cls in parent_classes if isinstance(cls, type) and cls in ROBOT_CLASSES])
         if num_api_parents == 0:
             class_list = list(parent_classes)
         elif num_api_parents == 1:
@@ -256,32 +361,20 @@ class SandBox:
             raise TerminalError("Robots can only inherit from a single API class")
 
         for index, parent in enumerate(class_list):
-            if parent in API_CLASSES:
+            if isinstance(parent, type) and parent in API_CLASSES:
                 class_list[index] = parent(_playground=self.playground)
-        source_class = SourceClass({"__name__": name}, class_list, function.code_block.module)
-
-        # Run the creation code function to set up our new class. Of course, the creation code just returns None, and we
-        # need to return the new class, so we'll need a little wrapper.
-
-        # A second complication is function, which is just a regular function, so its namespace is module. We want to
-        # use the class's namespace. To specify the right namespace, we'll create a temporary Constructor object.
-        constructor = Constructor(source_class=source_class, **function.__dict__)
-        with Function("__wrapper__", arguments={"creator": constructor, "source_class": source_class}) as wrapper:
-            # Call creation function
-            wrapper.LOAD_FAST("creator")
-            wrapper.CALL_FUNCTION(0)
-            # Discard result
-            wrapper.POP_TOP()
-            # Return class
-            wrapper.LOAD_FAST("source_class")
-            wrapper.RETURN_VALUE()
-        wrapper.call_in_sandbox(self)
-        raise DontPushReturnValue()
+        source_class = SourceClass({"__name__": name}, class_list, function.module)
+
+        # Run the creation code to set up our new class, with the class as its namespace. The creation code returns
+        # None, but we need to return the new class: have its frame do that for us.
+        self.call_frame(function, self.args_to_fast(function), source_class)
+        self.context.constructs = source_class
+        return FRAME_CHANGED
 
     def next_except_handler(self):
         # Any handlers left?
         while not self.context.try_stack:
-            self.call_stack.pop()
+            self.pop_frame()
             if not self.call_stack:
                 self.done = True
                 raise self.handling_exception
@@ -293,3 +386,4 @@ class SandBox:
         self.push(self.handling_exception.exception)
         self.push(self.handling_exception.exception)
         self.context.pc = try_pos.offset
+        return FRAME_CHANGED
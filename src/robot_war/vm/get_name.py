@@ -1,11 +1,16 @@
 from dataclasses import dataclass, field
-from typing import Dict, Any
+from itertools import count
+from typing import Dict, Any, Optional
+
+# Constants:
+VERSIONS = count()  # shared by every namespace, so a version number identifies both the namespace and its contents
 
 
 @dataclass
 class GetName:
     """Base class for classes """
     name_dict: Dict[str, Any] = field(default_factory=dict)
+    version: Optional[int] = field(default=None, init=False, repr=False, compare=False)  # None: lookups aren't cached
 
     def get_name(self, name: str):
         return self.name_dict[name]
@@ -21,3 +26,24 @@ class GetName:
 
     def del_name(self, name: str):
         del self.name_dict[name]
+
+
+@dataclass
+class VersionedNames(GetName):
+    """
+    A namespace that gets a new version whenever it changes, so instructions can cache what they looked up in it for
+    as long as the version stays the same. Change name_dict through set_name(), set_attr() and del_name() only.
+    """
+    version: Optional[int] = field(default_factory=lambda: next(VERSIONS), init=False, repr=False, compare=False)
+
+    def set_name(self, name: str, value: Any):
+        self.name_dict[name] = value
+        self.version = next(VERSIONS)
+
+    def set_attr(self, name: str, value: Any):
+        self.name_dict[name] = value
+        self.version = next(VERSIONS)
+
+    def del_name(self, name: str):
+        del self.name_dict[name]
+        self.version = next(VERSIONS)
@@ -0,0 +1,83 @@
+"""
+An index of the modules and packages under a robot's root directory, so that resolving an import is a few dictionary
+lookups rather than a few calls to Path.exists() per dotted part. Each directory is listed the first time an import
+looks in it. A listing is trusted for CONSTANTS.IMPORTS.REFRESH_SECONDS, after which the directory is checked again
+and listed afresh if its modification time has changed. Playgrounds with the same root path share one index.
+"""
+
+from dataclasses import dataclass, field
+import logging
+import os
+from pathlib import Path
+from time import monotonic
+from typing import Dict, FrozenSet
+
+from robot_war.constants import CONSTANTS
+
+# Constants:
+LOG = logging.getLogger(__name__)
+INIT = "__init__"
+
+
+@dataclass
+class Listing:
+    mtime_ns: int
+    checked: float  # monotonic() when we last made sure the directory hadn't changed
+    modules: FrozenSet[str]  # "x" for each x.py
+    directories: FrozenSet[str]  # possible packages: whether they are depends on their own listing
+
+
+@dataclass
+class ImportIndex:
+    root_path: Path
+    listings: Dict[Path, Listing] = field(default_factory=dict)
+
+    def listing(self, directory: Path) -> Listing:
+        now = monotonic()
+        listing = self.listings.get(directory)
+        if listing is not None and now - listing.checked < CONSTANTS.IMPORTS.REFRESH_SECONDS:
+            return listing
+
+        try:
+            mtime_ns = directory.stat().st_mtime_ns
+        except OSError:
+            mtime_ns = -1  # the directory doesn't exist (yet)
+        if listing is not None and listing.mtime_ns == mtime_ns:
+            listing.checked = now
+            return listing
+
+        modules = set()
+        directories = set()
+        if mtime_ns >= 0:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            directories.add(entry.name)
+                        elif entry.name.endswith(".py"):
+                            modules.add(entry.name[:-3])
+            except OSError as exc:
+                LOG.warning("Unable to list %s: %s", directory, exc)
+        listing = self.listings[directory] = Listing(mtime_ns, now, frozenset(modules), frozenset(directories))
+        return listing
+
+    def is_module(self, directory: Path, name: str) -> bool:
+        """Is there a name.py in directory?"""
+        return name in self.listing(directory).modules
+
+    def is_package(self, directory: Path, name: str) -> bool:
+        """Is there a name/__init__.py in directory?"""
+        if not name:
+            return self.is_module(directory, INIT)  # from . import x: is the directory itself a package?
+        return name in self.listing(directory).directories and self.is_module(directory / name, INIT)
+
+
+# Indexes by root path, shared by every Playground
+IMPORT_INDEXES: Dict[Path, ImportIndex] = {}
+
+
+def import_index(root_path: Path) -> ImportIndex:
+    index = IMPORT_INDEXES.get(root_path)
+    if index is None:
+        index = IMPORT_INDEXES[root_path] = ImportIndex(root_path)
+    return index
@@ -1,12 +1,15 @@
 from dataclasses import dataclass
 import logging
-from typing import Optional
+from typing import Optional, Callable, Any
 
 try:
     from robot_war.vm.exec_context import SandBox
 except ImportError:
     SandBox = None  # type: ignore
 
+# Types:
+Handler = Callable[[SandBox], Any]
+
 # Constants:
 LOG = logging.getLogger(__name__)
 
@@ -18,10 +21,25 @@ class CodeLine:
     op_code: str
     operand: int
     note: Optional[str]
+    value: Any = None  # the operand resolved when decoding, for instructions that need one: LOAD_CONST's constant
+
+    def __post_init__(self):
+        """Instructions can override this to look up whatever they need once, when decoded, rather than every time"""
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.operand}, {self.note})"
 
     def exec(self, sandbox: SandBox):
-        LOG.debug("%r", self)
-        sandbox.next()
+        """
+        Execute the instruction. SandBox.step() has already advanced the program counter past this instruction by the
+        time we're called, so jumps just overwrite it.
+        """
+
+
+def traced(code_line: CodeLine) -> Handler:
+    """Wrap an instruction's handler so that it logs each time it is executed"""
+    def handler(sandbox: SandBox):
+        LOG.debug("%r", code_line)
+        return code_line.exec(sandbox)
+
+    return handler
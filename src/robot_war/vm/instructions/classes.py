@@ -1,55 +1,107 @@
 import logging
+from typing import Any, Optional, Tuple
 
 from robot_war.vm.instructions import CodeLine
 
 try:
     from robot_war.vm.exec_context import SandBox
+    from robot_war.vm.source_class import Shape, SourceInstance
+    from robot_war.vm.source_functions import Function
+    from robot_war.vm.source_module import LazyModule
 except ImportError:
-    SandBox = None  # type: ignore
+    SandBox = Shape = SourceInstance = Function = LazyModule = None  # type: ignore
 
 # Constants:
 LOG = logging.getLogger(__name__)
 
 
 class LoadAttribute(CodeLine):
+    def __post_init__(self):
+        self.cache_shape: Optional[Shape] = None  # the shape of the last SourceInstance we read...
+        self.cache_index: Optional[int] = None  # ...and the slot our attribute was in, or None if it wasn't in one
+
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        sandbox.push(sandbox.pop().get_attr(self.note))
+        obj = sandbox.pop()
+        if type(obj) is SourceInstance:
+            if obj.shape is not self.cache_shape:
+                assert self.note
+                self.cache_shape = obj.shape
+                self.cache_index = obj.shape.slots.get(self.note)
+            if self.cache_index is not None:
+                sandbox.push(obj.slots[self.cache_index])
+                return
+        elif type(obj) is LazyModule:
+            return obj.load(sandbox)
+        sandbox.push(obj.get_attr(self.note))
 
 
 class LoadBuildClass(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push(sandbox.build_class)
 
 
 class LoadMethod(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        assert self.note
         obj = sandbox.pop()
+        if type(obj) is LazyModule:
+            return obj.load(sandbox)
+        method, instance = self.resolve(obj)
+        sandbox.push(method)
+        sandbox.push(instance)
+
+    def resolve(self, obj) -> Tuple[Any, Optional[SourceInstance]]:
+        """
+        Returns obj's method and, if CALL_METHOD must pass it as self, obj. That way calling a method of a user class
+        doesn't need a BoundMethod.
+        """
+        assert self.note
+        if type(obj) is SourceInstance:
+            index = obj.shape.slots.get(self.note)
+            if index is not None:
+                return obj.slots[index], None
+            method = obj.get_name(self.note)
+            return (method, obj) if isinstance(method, Function) else (method, None)
         try:
-            sandbox.push(obj.get_method(self.note))
+            return obj.get_method(self.note), None
         except AttributeError:
-            sandbox.push(getattr(obj, self.note))
+            return getattr(obj, self.note), None
 
 
 class LoadName(CodeLine):
+    def __post_init__(self):
+        self.cache_version: Optional[int] = None  # version of the namespace that cache_value came from
+        self.cache_value = None  # shared by every Playground: see decode()
+
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         assert self.note
         get_name_obj = sandbox.context.get_name_obj
         assert get_name_obj
-        sandbox.push(get_name_obj.get_name(self.note))
+        version = get_name_obj.version
+        if version is None:
+            # Class bodies look through their parents and module: nothing we can cache on a single version
+            sandbox.push(get_name_obj.get_name(self.note))
+        else:
+            if version != self.cache_version:
+                self.cache_value = get_name_obj.get_name(self.note)
+                self.cache_version = version
+            sandbox.push(self.cache_value)
 
 
 class MakeFunction(CodeLine):
+    def __post_init__(self):
+        self.cache_code = None  # the code object we last made a function from...
+        self.cache_block = None  # ...and its code block
+
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         name = sandbox.pop()
-        code_block = sandbox.pop()
+        code = sandbox.pop()
+        if code is not self.cache_code:
+            # Nested code is decoded the first time we get to it
+            from robot_war.vm.source_module import decode
+            self.cache_block = decode(code)
+            self.cache_code = code
         from robot_war.vm.source_functions import Function
-        function = Function(name, code_block=code_block)
+        function = Function(name, self.cache_block, sandbox.context.function.module)
         if self.operand & 0x08:
             function.closure = sandbox.pop()
         if self.operand & 0x04:
@@ -65,23 +117,48 @@ class MakeFunction(CodeLine):
 
 class SetupAnnotations(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         get_name_obj = sandbox.context.get_name_obj
         assert get_name_obj
-        get_name_obj.name_dict["__annotations__"] = {}
+        get_name_obj.set_name("__annotations__", {})
 
 
 class StoreAttribute(CodeLine):
+    def __post_init__(self):
+        self.cache_shape: Optional[Shape] = None  # instances of this shape already have our attribute...
+        self.cache_index = 0  # ...in this slot
+        self.cache_before: Optional[Shape] = None  # instances of this shape don't have it yet...
+        self.cache_after: Any = None  # ...and become this shape when it's added
+
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         obj = sandbox.pop()
         value = sandbox.pop()
-        obj.set_attr(self.note, value)
+        if type(obj) is SourceInstance:
+            shape = obj.shape
+            if shape is self.cache_shape:
+                obj.slots[self.cache_index] = value
+                return
+            if shape is self.cache_before:
+                obj.shape = self.cache_after
+                obj.slots.append(value)
+                return
+
+            assert self.note
+            obj.set_attr(self.note, value)
+            if obj.shape is shape:
+                self.cache_shape = shape
+                self.cache_index = shape.slots[self.note]
+            else:
+                self.cache_before = shape
+                self.cache_after = obj.shape
+        elif type(obj) is LazyModule:
+            sandbox.push(value)
+            return obj.load(sandbox)
+        else:
+            obj.set_attr(self.note, value)
 
 
 class StoreName(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         get_name_obj = sandbox.context.get_name_obj
         assert get_name_obj and self.note
-        get_name_obj.name_dict[self.note] = sandbox.pop()
+        get_name_obj.set_name(self.note, sandbox.pop())
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 import logging
+import operator
 from typing import Optional, Iterable
 
 from robot_war.vm.instructions import CodeLine
@@ -11,8 +12,17 @@ except ImportError:
 
 # Constants:
 LOG = logging.getLogger(__name__)
-COMPARE_DICT = {"<": lambda a, b: a < b, "<=": lambda a, b: a <= b, ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
-                "==": lambda a, b: a == b, "!=": lambda a, b: a != b, }
+COMPARE_OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "==": operator.eq,
+                     "!=": operator.ne}
+
+
+class Unbound:
+    """The value of a local variable that hasn't been assigned yet, or has been deleted"""
+    def __repr__(self):
+        return "UNBOUND"
+
+
+UNBOUND = Unbound()
 
 
 @dataclass
@@ -23,7 +33,6 @@ class Slice:
 
 class BinarySlice(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         end = sandbox.pop()
         start = sandbox.pop()
         container = sandbox.pop()
@@ -32,7 +41,6 @@ class BinarySlice(CodeLine):
 
 class BinarySubscript(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         key = sandbox.pop()
         container = sandbox.pop()
         sandbox.push(container[key.start:key.end] if isinstance(key, Slice) else container[key])
@@ -40,42 +48,30 @@ class BinarySubscript(CodeLine):
 
 class BuildConstKeyMap(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         keys = sandbox.pop()
-        values = sandbox.context.data_stack[-len(keys):]
-        sandbox.context.data_stack = sandbox.context.data_stack[:-len(keys)]
-        sandbox.push({key: values[index] for index, key in enumerate(keys)})
+        values = sandbox.pop_many(len(keys))
+        sandbox.push(dict(zip(keys, values)))
 
 
 class BuildList(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        data_stack = sandbox.context.data_stack
-        if self.operand:
-            sandbox.context.data_stack, values = data_stack[:-self.operand], data_stack[-self.operand:]
-        else:
-            values = []
-        sandbox.push(values)
+        sandbox.push(sandbox.pop_many(self.operand))
 
 
 class BuildMap(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        context = sandbox.context
         num_items = self.operand * 2
-        context.data_stack, values = context.data_stack[:-num_items], context.data_stack[-num_items:]
+        values = sandbox.pop_many(num_items)
         sandbox.push({values[i]: values[i + 1] for i in range(0, num_items, 2)})
 
 
 class BuildSet(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push({sandbox.pop() for _ in range(self.operand)})
 
 
 class BuildSlice(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         end = sandbox.pop()
         start = sandbox.pop()
         sandbox.push(Slice(start, end))
@@ -83,7 +79,6 @@ class BuildSlice(CodeLine):
 
 class BuildString(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         value = ""
         for _ in range(self.operand):
             value = sandbox.pop() + value
@@ -92,44 +87,39 @@ class BuildString(CodeLine):
 
 class BuildTuple(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        data_stack = sandbox.context.data_stack
-        sandbox.context.data_stack, values = data_stack[:-self.operand], data_stack[-self.operand:]
-        sandbox.push(tuple(values))
+        sandbox.push(tuple(sandbox.pop_many(self.operand)))
 
 
 class CompareOperand(CodeLine):
+    def __post_init__(self):
+        assert self.note
+        self.compare = COMPARE_OPERATORS[self.note]
+
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         arg2 = sandbox.pop()
         arg1 = sandbox.pop()
-        assert self.note
-        sandbox.push(COMPARE_DICT[self.note](arg1, arg2))
+        sandbox.push(self.compare(arg1, arg2))
 
 
 class Copy(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push(sandbox.peek(-self.operand))
 
 
 class DeleteFast(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        del sandbox.context.fast_stack[self.operand]
+        sandbox.context.fast_stack[self.operand] = UNBOUND
 
 
 class DeleteGlobal(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        module = sandbox.context.function.code_block.module
+        module = sandbox.context.function.module
         assert module and self.note
         module.del_name(self.note)
 
 
 class DeleteSubscript(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         key = sandbox.pop()
         container = sandbox.pop()
         del container[key]
@@ -137,13 +127,11 @@ class DeleteSubscript(CodeLine):
 
 class DupTop(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push(sandbox.peek(-1))
 
 
 class FormatValue(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         format_str = sandbox.pop() if self.operand & 0x04 else None
         value = sandbox.pop()
         flags3 = self.operand & 0x03
@@ -158,13 +146,11 @@ class FormatValue(CodeLine):
 
 class GetLength(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push(len(sandbox.peek(-1)))
 
 
 class ListAppend(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         item = sandbox.pop()
         the_list: list = sandbox.peek(-self.operand)
         the_list.append(item)
@@ -172,7 +158,6 @@ class ListAppend(CodeLine):
 
 class ListExtend(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         extend: Iterable = sandbox.pop()
         the_list: list = sandbox.pop()
         for item in extend:
@@ -182,53 +167,50 @@ class ListExtend(CodeLine):
 
 class LoadClosure(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push(sandbox.context.deref[self.operand])
 
 
 class LoadDeref(LoadClosure):
-    pass
+    def exec(self, sandbox: SandBox):
+        value = sandbox.context.deref[self.operand]
+        if value is UNBOUND:
+            raise NameError(f"free variable '{self.note}' referenced before assignment in enclosing scope")
+        sandbox.push(value)
 
 
 class LoadConstant(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        assert self.note
-        constants = sandbox.context.function.code_block.constants
-
-        # We don't preprocess the constants, just deal with them the first time they pop up. Have we done this one yet?
-        if self.operand not in constants:
-            # Not yet. Is it a code block?
-            if self.note.startswith("<"):
-                # Yes, grab the code
-                module = sandbox.context.function.code_block.module
-                assert module
-                constants[self.operand] = module.get_name(self.note)
-            else:
-                # Something simple, just eval it
-                from pathlib import WindowsPath  # noqa Should allow us to eval a constant path
-                constants[self.operand] = eval(self.note)
-
-        sandbox.push(constants[self.operand])
+        sandbox.push(self.value)
 
 
 class LoadFast(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        sandbox.push(sandbox.context.fast_stack[self.operand])
+        value = sandbox.context.fast_stack[self.operand]
+        if value is UNBOUND:
+            raise UnboundLocalError(f"local variable '{self.note}' referenced before assignment")
+        sandbox.push(value)
 
 
 class LoadGlobal(CodeLine):
+    def __post_init__(self):
+        self.cache_version: Optional[int] = None  # version of the module namespace that cache_value came from
+        self.cache_value = None  # shared by every Playground: see decode()
+
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        module = sandbox.context.function.code_block.module
+        sandbox.push(self.resolve(sandbox))
+
+    def resolve(self, sandbox: SandBox):
+        """Returns the global's value, straight from our cache unless the module's namespace has changed since"""
+        module = sandbox.context.function.module
         assert module and self.note
-        sandbox.push(module.name_dict[self.note])
+        if module.version != self.cache_version:
+            self.cache_value = module.get_name(self.note)
+            self.cache_version = module.version
+        return self.cache_value
 
 
 class LoadSubscript(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         key = sandbox.pop()
         container = sandbox.pop()
         sandbox.push(container[key])
@@ -236,7 +218,6 @@ class LoadSubscript(CodeLine):
 
 class MapAdd(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         value = sandbox.pop()
         key = sandbox.pop()
         the_dict: dict = sandbox.peek(-self.operand)
@@ -245,13 +226,11 @@ class MapAdd(CodeLine):
 
 class PopTop(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.pop()
 
 
 class SetAdd(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         item = sandbox.pop()
         the_set: set = sandbox.peek(-self.operand)
         the_set.add(item)
@@ -259,7 +238,6 @@ class SetAdd(CodeLine):
 
 class SetUpdate(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         items: Iterable = sandbox.pop()
         the_set: set = sandbox.pop()
         sandbox.push(the_set.union(items))
@@ -267,21 +245,18 @@ class SetUpdate(CodeLine):
 
 class StoreFast(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.context.fast_stack[self.operand] = sandbox.pop()
 
 
 class StoreGlobal(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        module = sandbox.context.function.code_block.module
+        module = sandbox.context.function.module
         assert module and self.note
         module.set_name(self.note, sandbox.pop())
 
 
 class StoreSubscript(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         index = sandbox.pop()
         obj = sandbox.pop()
         obj[index] = sandbox.pop()
@@ -289,13 +264,11 @@ class StoreSubscript(CodeLine):
 
 class StoreDeref(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.context.deref[self.operand] = sandbox.pop()
 
 
 class StoreSlice(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         end = sandbox.pop()
         start = sandbox.pop()
         container = sandbox.pop()
@@ -304,6 +277,5 @@ class StoreSlice(CodeLine):
 
 class Swap(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         ctext = sandbox.context
         ctext.data_stack[-self.operand], ctext.data_stack[-1] = ctext.data_stack[-1], ctext.data_stack[-self.operand]
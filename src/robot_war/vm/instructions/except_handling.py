@@ -91,7 +91,7 @@ finally:
 
 @dataclass
 class TryOffset:
-    offset: int
+    offset: int  # index of the handler in CodeBlock.code_lines
     stack_depth: int
 
 
@@ -111,7 +111,6 @@ class VMException(Exception):
 
 class JumpIfNotExcMatch(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         compare_type = sandbox.pop()
         except_type = sandbox.pop()
         if isinstance(compare_type, tuple):
@@ -123,13 +122,11 @@ class JumpIfNotExcMatch(CodeLine):
 
 class LoadAssertionError(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push(AssertionError)
 
 
 class PopBlock(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         with_offset = sandbox.context.try_stack.pop()
         if isinstance(with_offset, WithOffset):
             sandbox.push(with_offset.instance.get_name("__exit__"))
@@ -137,17 +134,15 @@ class PopBlock(CodeLine):
 
 class PopExcept(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.context.try_stack.pop()
 
 
 class RaiseVarArgs(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         if self.operand == 0:
             # re-raise
             sandbox.context.try_stack.pop()
-            sandbox.next_except_handler()
+            return sandbox.next_except_handler()
         else:
             assert self.operand != 2, "TODO: raise with cause"
             raise sandbox.pop()
@@ -155,31 +150,28 @@ class RaiseVarArgs(CodeLine):
 
 class Reraise(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.context.try_stack.pop()
-        sandbox.next_except_handler()
+        return sandbox.next_except_handler()
 
 
 class SetupFinally(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        try_offset = TryOffset(sandbox.context.pc + self.operand, len(sandbox.context.data_stack))
+        try_offset = TryOffset(self.operand, len(sandbox.context.data_stack))
         sandbox.context.try_stack.append(try_offset)
 
 
 class SetupWith(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         instance = sandbox.pop()
-        with_offset = WithOffset(sandbox.context.pc + self.operand, len(sandbox.context.data_stack), instance)
+        with_offset = WithOffset(self.operand, len(sandbox.context.data_stack), instance)
         sandbox.context.try_stack.append(with_offset)
-        sandbox.call_function(instance.get_name("__enter__"), instance)
+        return sandbox.call_function(instance.get_name("__enter__"), instance)
 
 
 class WithExceptStart(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         try_offset = sandbox.context.try_stack[-1]
         assert isinstance(try_offset, WithOffset)
         sandbox.push(try_offset.instance)
-        sandbox.call_function(try_offset.instance.get_name("__exit__"), sandbox.peek(-1), sandbox.peek(-2), sandbox.peek(-3))
+        return sandbox.call_function(
+            try_offset.instance.get_name("__exit__"), sandbox.peek(-1), sandbox.peek(-2), sandbox.peek(-3))
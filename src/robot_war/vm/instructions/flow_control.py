@@ -1,6 +1,7 @@
 import logging
+from typing import Callable, Dict
 
-from robot_war.exceptions import ReturnException
+from robot_war.constants import CONSTANTS
 from robot_war.vm.instructions import CodeLine
 
 try:
@@ -12,68 +13,86 @@ except ImportError:
 LOG = logging.getLogger(__name__)
 
 
-class CallFunction(CodeLine):
+class CallSite(CodeLine):
+    """
+    An instruction that makes calls. Each remembers, for the few types of callee it has seen, which of SandBox's call
+    paths to take, so that calling doesn't need to work out what kind of callee it has every time. Call sites that see
+    too many types of callee fall back on SandBox.call_function().
+    """
+    def __post_init__(self):
+        self.call_paths: Dict[type, Callable] = {}
+
+    def call(self, sandbox: SandBox, function, *args, **kwargs):
+        path = self.call_paths.get(type(function))
+        if path is None:
+            path = self.learn(type(function))
+        return path(sandbox, function, *args, **kwargs)
+
+    def learn(self, callee_type: type) -> Callable:
+        from robot_war.vm.exec_context import call_path
+        if len(self.call_paths) >= CONSTANTS.VM.CALL_SITE_SIZE:
+            return call_path(callee_type)
+        path = self.call_paths[callee_type] = call_path(callee_type)
+        return path
+
+
+class CallFunction(CallSite):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        rev_args = [sandbox.pop() for _ in range(self.operand)]
-        sandbox.call_function(sandbox.pop(), *reversed(rev_args))
+        args = sandbox.pop_many(self.operand)
+        return self.call(sandbox, sandbox.pop(), *args)
 
 
-class CallFunctionKW(CodeLine):
+class CallFunctionKW(CallSite):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         tuple_kw_params = sandbox.pop()
         kwargs = {}
         for key in reversed(tuple_kw_params):
             kwargs[key] = sandbox.pop()
-        rev_args = [sandbox.pop() for _ in range(self.operand - len(kwargs))]
-        sandbox.call_function(sandbox.pop(), *reversed(rev_args), **kwargs)
+        args = sandbox.pop_many(self.operand - len(kwargs))
+        return self.call(sandbox, sandbox.pop(), *args, **kwargs)
 
 
-class CallMethod(CodeLine):
+class CallMethod(CallSite):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        rev_args = [sandbox.pop() for _ in range(self.operand)]
-        sandbox.call_function(sandbox.pop(), *reversed(rev_args))
+        args = sandbox.pop_many(self.operand)
+        instance = sandbox.pop()  # see LoadMethod
+        method = sandbox.pop()
+        if instance is None:
+            return self.call(sandbox, method, *args)
+        return self.call(sandbox, method, instance, *args)
 
 
 class ForIter(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         try:
             sandbox.push(next(sandbox.peek(-1)))
         except StopIteration:
             sandbox.pop()
-            sandbox.context.pc += self.operand
+            sandbox.context.pc = self.operand
 
 
 class GetIter(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push(iter(sandbox.pop()))
 
 
 class JumpAbsolute(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.context.pc = self.operand
 
 
 class JumpBackward(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        sandbox.context.pc -= self.operand
+        sandbox.context.pc = self.operand
 
 
 class JumpForward(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        sandbox.context.pc += self.operand
+        sandbox.context.pc = self.operand
 
 
 class PopJumpIfFalse(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         value = sandbox.pop()
         if not value:
             sandbox.context.pc = self.operand
@@ -81,7 +100,6 @@ class PopJumpIfFalse(CodeLine):
 
 class PopJumpIfNone(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         value = sandbox.pop()
         if value is None:
             sandbox.context.pc = self.operand
@@ -89,7 +107,6 @@ class PopJumpIfNone(CodeLine):
 
 class PopJumpIfNotNone(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         value = sandbox.pop()
         if value is not None:
             sandbox.context.pc = self.operand
@@ -97,7 +114,6 @@ class PopJumpIfNotNone(CodeLine):
 
 class PopJumpIfTrue(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         value = sandbox.pop()
         if value:
             sandbox.context.pc = self.operand
@@ -105,5 +121,4 @@ class PopJumpIfTrue(CodeLine):
 
 class ReturnValue(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        raise ReturnException(sandbox.pop())
+        return sandbox.return_from_function(sandbox.pop())
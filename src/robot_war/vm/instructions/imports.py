@@ -1,14 +1,15 @@
 import logging
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Any, List, Tuple, Optional
 
 from robot_war.vm.instructions import CodeLine
 
 try:
     from robot_war.vm.exec_context import SandBox
-    from robot_war.vm.source_module import Module
+    from robot_war.vm.source_functions import FunctionCreator
+    from robot_war.vm.source_module import LazyModule, Module
 except ImportError:
-    SandBox = Module = None  # type: ignore
+    SandBox = FunctionCreator = LazyModule = Module = None  # type: ignore
 
 # Constants:
 LOG = logging.getLogger(__name__)
@@ -68,15 +69,16 @@ ROBOT_WAR = "robot_war"
 
 class ImportFrom(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         module: Module = sandbox.peek(-1)
+        if type(module) is LazyModule:
+            sandbox.pop()
+            return module.load(sandbox)
         assert self.note
         sandbox.push(module.get_name(self.note))
 
 
 class ImportName(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         from_list: Optional[Tuple[str]] = sandbox.pop()
         # None: import x.y.z
         # Tuple[str] like ("y", "z"): from x import y, z
@@ -94,40 +96,57 @@ class ImportName(CodeLine):
         elif (level == 0) and (parts[0] in MODULES):
             self.load_native_module(sandbox, parts)
         else:
-            from robot_war.vm.source_functions import Function
+            from robot_war.vm.source_functions import trampoline
             modules_loaded, tuples_to_load, mod_path = self.find_load_files(sandbox, level, parts, from_list)
 
-            # Now that we know which modules we have and which files must be loaded, we can create a function to do this
+            # Now that we know which modules we have and which files must be loaded, we can run a function to do this
             # for us. We can't just do it here because loading modules involves running the top-level code in those
             # modules. We don't do that. We just add it to the stack and let it run at its own rate. But when it
             # completes, we will need to discard the return code (a None) and handle the rest of the operation.
-            arguments = {"modules_loaded": modules_loaded}
-            with Function("__import_name__", arguments=arguments) as import_name:
-                import_name.LOAD_FAST("modules_loaded")
-                link_up = bool(modules_loaded)  # if we've got any loaded, we'll need to link the module name into it
-                for index in range(len(tuples_to_load)):
-                    import_name.LOAD_CONST(repr(tuples_to_load[index]))
-                    import_name.LOAD_MODULE_FILE_1()  # load the module
-                    if link_up:
-                        import_name.LOAD_CONST(repr(tuples_to_load[index][0]))
-                        import_name.LOAD_MODULE_FILE_2()
-                        link_up = True
-
-                if from_list is None:
-                    import_name.LOAD_CONST("0")
-                    import_name.LOAD_SUBSCR()
-                else:
-                    import_name.POP_TOP()
-                    import_name.LOAD_MODULE_FILE_3(mod_path)
-                import_name.RETURN_VALUE()
-
-            import_name.call_in_sandbox(sandbox)
+            link_up = bool(modules_loaded)  # if we've got any loaded, we'll need to link the module name into it
+            key = ("__import_name__", len(tuples_to_load), link_up, from_list is None)
+            import_name = trampoline(key, lambda: self.build_import(len(tuples_to_load), link_up, from_list is None))
+            args: List[Any] = [modules_loaded]
+            for tuple_to_load in tuples_to_load:
+                args.append(tuple_to_load)
+                if link_up:
+                    args.append(tuple_to_load[0])
+            if from_list is not None:
+                args.append(mod_path)
+
             # TODO: Need to be some sort of mechanism to verify that we actually imported the name
+            return sandbox.call_function(import_name, *args)
+
+    @staticmethod
+    def build_import(num_loads: int, link_up: bool, import_path: bool) -> "FunctionCreator":
+        """
+        Build a function that loads num_loads module files, linking each into its parent if link_up, and returns the
+        top module if import_path (import x.y.z) or else the last (from x.y import z)
+        """
+        from robot_war.vm.source_functions import FunctionCreator
+        with FunctionCreator("__import_name__", ["modules_loaded"]) as import_name:
+            import_name.LOAD_FAST("modules_loaded")
+            for index in range(num_loads):
+                import_name.LOAD_FAST(f"_load{index}")
+                import_name.LOAD_MODULE_FILE_1()  # load the module
+                if link_up:
+                    import_name.LOAD_FAST(f"_name{index}")
+                    import_name.LOAD_MODULE_FILE_2()
+
+            if import_path:
+                import_name.LOAD_CONST(0)
+                import_name.LOAD_SUBSCR()
+            else:
+                import_name.POP_TOP()
+                import_name.LOAD_FAST("mod_path")
+                import_name.LOAD_MODULE_FILE_3()
+            import_name.RETURN_VALUE()
+        return import_name
 
     @staticmethod
     def load_native_module(sandbox: SandBox, parts: List[str]):
         from robot_war.api import MODULES
-        module = MODULES[parts[0]]
+        module = sandbox.playground.api_module(parts[0], MODULES[parts[0]])
         sandbox.push(module)
         if len(parts) == 2:
             assert parts[1] in module.name_dict
@@ -138,10 +157,10 @@ class ImportName(CodeLine):
     def load_api(sandbox: SandBox, parts: List[str]):
         if parts == [ROBOT_WAR]:
             from robot_war.api import ROBOT_MODULE
-            sandbox.push(ROBOT_MODULE)
+            sandbox.push(sandbox.playground.api_module(ROBOT_WAR, ROBOT_MODULE))
         elif len(parts) == 2:
             from robot_war.api import MODELS
-            sandbox.push(MODELS[parts[1]])
+            sandbox.push(sandbox.playground.api_module(".".join(parts), MODELS[parts[1]]))
         else:
             raise ImportError(f"Unable to import {'.'.join(parts)}")
 
@@ -187,17 +206,17 @@ class ImportName(CodeLine):
             return [sandbox.playground.all_modules[dotted]] + modules_loaded, tuples_to_load
 
         # Does the next part exist as a directory?
-        path = start_dir / parts[0] / "__init__.py"
-        if path.exists():
+        index = sandbox.playground.import_index
+        if index.is_package(start_dir, parts[0]):
             # Yes, continue from there
             modules_loaded, tuples_to_load = ImportName.find_files(
                 sandbox, parts[1:], dot_path, start_dir / parts[0], from_list)
-            return modules_loaded, [(dotted, path)] + tuples_to_load
+            return modules_loaded, [(dotted, start_dir / parts[0] / "__init__.py")] + tuples_to_load
 
         # Does the next part exist as a regular file?
-        path = start_dir / f"{parts[0]}.py"
-        if path.exists():
+        if index.is_module(start_dir, parts[0]):
             # Yes, stop there
+            path = start_dir / f"{parts[0]}.py"
             from_path = ".".join(from_dot_path)
             all_modules = sandbox.playground.all_modules
             loaded = [all_modules[from_path]] if from_path in all_modules else []
@@ -225,7 +244,7 @@ class ImportName(CodeLine):
         #         "dotted path to module like 'a.b.c'
         #     )
 
-        current_module = sandbox.context.function.code_block.module
+        current_module = sandbox.context.function.module
         assert current_module
         file_path = current_module.path
         assert isinstance(file_path, Path)
@@ -240,8 +259,9 @@ class ImportName(CodeLine):
                     sandbox, parts, [], sandbox.playground.root_path, from_list) + (mod_path,)
 
             # We haven't loaded any of that yet, but the files might exist. Look for the files.
-            if (sandbox.playground.root_path / f"{parts[0]}.py").exists() or \
-                    (sandbox.playground.root_path / parts[0] / "__init__.py").exists():
+            root_path = sandbox.playground.root_path
+            index = sandbox.playground.import_index
+            if index.is_module(root_path, parts[0]) or index.is_package(root_path, parts[0]):
                 # Found it; start there
                 return ImportName.find_files(
                     sandbox, parts, [], sandbox.playground.root_path, from_list) + (mod_path,)
@@ -279,10 +299,11 @@ class ImportStar(CodeLine):
         pop TOP: Module
         Load all names that don't begin with a "_" nor a "<"
         """
-        super().exec(sandbox)
         from robot_war.vm.source_module import Module
         import_from: Module = sandbox.pop()
-        import_to = sandbox.context.function.code_block.module
+        if type(import_from) is LazyModule:
+            return import_from.load(sandbox)
+        import_to = sandbox.context.function.module
         assert import_to
         for name, value in import_from.name_dict.items():
             if name[0] not in ["<", "-"]:
@@ -296,26 +317,37 @@ class LoadModuleFile1(CodeLine):
         pop TOS1: [module(0), module(1), ... module(N-1)]
         Load a module_name as module(N) from file_path
         push TOS: [module(0), module(1), ... module(N)]
+        With lazy imports, module(N) is a LazyModule, and its code doesn't run yet.
         """
         # Note that I made this an opcode instead of a function to ensure that the user can't call it somehow
-        super().exec(sandbox)
         from robot_war.vm.source_module import Module
         module_dot_path, file_path = sandbox.pop()
         module_dot_list = module_dot_path.split(".")
         module_list: List[Module] = sandbox.pop()
-        from robot_war.vm.source_functions import Function
-        with Function("__load_module_file_1__", arguments={"module_list": module_list}) as load:
-            load.POP_TOP()  # Discard the None that will be returned by importing the module
-            load.LOAD_FAST("module_list")  # Return the module list we create in advance
-            load.RETURN_VALUE()  # This will do the push
-        load.call_in_sandbox(sandbox)
         module_name = module_dot_list[-1]
-        module = Module(module_name, path=file_path, dot_path=module_dot_list)
+        lazy = sandbox.playground.lazy_imports
+        module = (LazyModule if lazy else Module)(module_name, path=file_path, dot_path=module_dot_list)
         current_module_name = "__main__" if len(module_dot_list) == 1 else ".".join(module_dot_list[:-1])
         sandbox.playground.all_modules[current_module_name].set_name(module_name, module)
         module_list.append(module)
         sandbox.playground.all_modules[module_dot_path] = module
-        sandbox.call_function(module.read_source_file(file_path))
+        if lazy:
+            sandbox.push(module_list)
+            return None
+
+        from robot_war.vm.source_functions import trampoline
+        sandbox.call_function(trampoline("__load_module_file_1__", LoadModuleFile1.build_load), module_list)
+        return sandbox.call_function(module.read_source_file(file_path))
+
+    @staticmethod
+    def build_load() -> "FunctionCreator":
+        """Build a function that takes the module list and returns it once the module's top-level code has run"""
+        from robot_war.vm.source_functions import FunctionCreator
+        with FunctionCreator("__load_module_file_1__", ["module_list"]) as load:
+            load.POP_TOP()  # Discard the None that will be returned by importing the module
+            load.LOAD_FAST("module_list")  # Return the module list we create in advance
+            load.RETURN_VALUE()  # This will do the push
+        return load
 
 
 class LoadModuleFile2(CodeLine):
@@ -325,7 +357,6 @@ class LoadModuleFile2(CodeLine):
         TOS1: [module(0), module(1), ... module(N)]
         Set module(N-1).module_dot_name = module(N)
         """
-        super().exec(sandbox)
         module_dot_name: str = sandbox.pop()
         module_name = module_dot_name.split(".")[-1]
         from robot_war.vm.source_module import Module
@@ -335,6 +366,8 @@ class LoadModuleFile2(CodeLine):
 
 class LoadModuleFile3(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
-        assert self.note
-        sandbox.push(sandbox.playground.all_modules[self.note])
+        """
+        pop TOS: module_dot_path: str
+        push TOS: the module loaded as module_dot_path
+        """
+        sandbox.push(sandbox.playground.all_modules[sandbox.pop()])
@@ -1,4 +1,5 @@
 import logging
+import operator
 
 from robot_war.vm.instructions import CodeLine
 
@@ -9,11 +10,13 @@ except ImportError:
 
 # Constants:
 LOG = logging.getLogger(__name__)
+INPLACE_OPERATORS = {
+    "INPLACE_ADD": operator.iadd, "INPLACE_FLOOR_DIVIDE": operator.ifloordiv, "INPLACE_MODULO": operator.imod,
+    "INPLACE_MULTIPLY": operator.imul, "INPLACE_SUBTRACT": operator.isub, "INPLACE_TRUE_DIVIDE": operator.itruediv}
 
 
 class BinaryAdd(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         arg2 = sandbox.pop()
         arg1 = sandbox.pop()
         sandbox.push(arg1 + arg2)
@@ -21,7 +24,6 @@ class BinaryAdd(CodeLine):
 
 class BinaryModulo(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         arg2 = sandbox.pop()
         arg1 = sandbox.pop()
         sandbox.push(arg1 % arg2)
@@ -29,7 +31,6 @@ class BinaryModulo(CodeLine):
 
 class BinaryMultiply(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         arg2 = sandbox.pop()
         arg1 = sandbox.pop()
         sandbox.push(arg1 * arg2)
@@ -37,7 +38,6 @@ class BinaryMultiply(CodeLine):
 
 class BinarySubtract(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         arg2 = sandbox.pop()
         arg1 = sandbox.pop()
         sandbox.push(arg1 - arg2)
@@ -45,7 +45,6 @@ class BinarySubtract(CodeLine):
 
 class BinaryFloorDivide(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         arg2 = sandbox.pop()
         arg1 = sandbox.pop()
         sandbox.push(arg1 // arg2)
@@ -53,7 +52,6 @@ class BinaryFloorDivide(CodeLine):
 
 class BinaryTrueDivide(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         arg2 = sandbox.pop()
         arg1 = sandbox.pop()
         sandbox.push(arg1 / arg2)
@@ -61,15 +59,24 @@ class BinaryTrueDivide(CodeLine):
 
 class ContainsOperand(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         arg2 = sandbox.pop()
         arg1 = sandbox.pop()
         sandbox.push((arg1 not in arg2) if self.operand else (arg1 in arg2))
 
 
+class InplaceOperator(CodeLine):
+    """x += y and friends, which change mutable objects like lists in place"""
+    def __post_init__(self):
+        self.operation = INPLACE_OPERATORS[self.op_code]
+
+    def exec(self, sandbox: SandBox):
+        arg2 = sandbox.pop()
+        arg1 = sandbox.pop()
+        sandbox.push(self.operation(arg1, arg2))
+
+
 class IsOperand(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         arg2 = sandbox.pop()
         arg1 = sandbox.pop()
         sandbox.push((arg1 is not arg2) if self.operand else (arg1 is arg2))
@@ -77,17 +84,14 @@ class IsOperand(CodeLine):
 
 class UnaryInvert(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push(~sandbox.pop())
 
 
 class UnaryNegative(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push(-sandbox.pop())
 
 
 class UnaryNot(CodeLine):
     def exec(self, sandbox: SandBox):
-        super().exec(sandbox)
         sandbox.push(not sandbox.pop())
@@ -1,6 +1,9 @@
 """Opcode dictionary"""
 
-from robot_war.vm.instructions import classes, data, flow_control, imports, math, misc, except_handling
+from typing import Callable, Dict, List, Tuple
+
+from robot_war.vm.instructions import (
+    CodeLine, classes, data, flow_control, imports, math, misc, except_handling, superinstructions)
 
 OP_CODE_CLASSES = {
     "BINARY_ADD": math.BinaryAdd,
@@ -28,17 +31,19 @@ OP_CODE_CLASSES = {
     "DELETE_GLOBAL": data.DeleteGlobal,
     "DELETE_SUBSCR": data.DeleteSubscript,
     "DUP_TOP": data.DupTop,
+    "EXTENDED_ARG": misc.Nop,  # dis has already folded the argument into the next instruction
     "FOR_ITER": flow_control.ForIter,
     "FORMAT_VALUE": data.FormatValue,
     "GET_ITER": flow_control.GetIter,
     "IMPORT_FROM": imports.ImportFrom,
     "IMPORT_NAME": imports.ImportName,
     "IMPORT_STAR": imports.ImportStar,
-    "INPLACE_ADD": math.BinaryAdd,
-    "INPLACE_MULTIPLY": math.BinaryMultiply,
-    "INPLACE_SUBTRACT": math.BinarySubtract,
-    "INPLACE_FLOOR_DIVIDE": math.BinaryFloorDivide,
-    "INPLACE_TRUE_DIVIDE": math.BinaryTrueDivide,
+    "INPLACE_ADD": math.InplaceOperator,
+    "INPLACE_MODULO": math.InplaceOperator,
+    "INPLACE_MULTIPLY": math.InplaceOperator,
+    "INPLACE_SUBTRACT": math.InplaceOperator,
+    "INPLACE_FLOOR_DIVIDE": math.InplaceOperator,
+    "INPLACE_TRUE_DIVIDE": math.InplaceOperator,
     "INPLACE_SLICE": data.BinarySlice,
     "INPLACE_SUBSCR": data.BinarySubscript,
     "IS_OP": math.IsOperand,
@@ -93,3 +98,29 @@ OP_CODE_CLASSES = {
     "UNARY_NOT": math.UnaryNot,
     "WITH_EXCEPT_START": except_handling.WithExceptStart
 }
+
+# Runs of op-codes that CodeBlock.build_dispatch() fuses into one handler. Longer runs first: the first match wins.
+SUPERINSTRUCTIONS: Dict[Tuple[str, ...], Callable[[List[CodeLine]], superinstructions.Superinstruction]] = {
+    ("LOAD_FAST", "LOAD_CONST", "COMPARE_OP", "POP_JUMP_IF_FALSE"): superinstructions.LoadFastCompareConstJump,
+    ("LOAD_FAST", "LOAD_FAST"): superinstructions.LoadFastLoadFast,
+    ("LOAD_GLOBAL", "CALL_FUNCTION"): superinstructions.LoadGlobalCallFunction,
+    ("LOAD_METHOD", "CALL_METHOD"): superinstructions.LoadMethodCallMethod
+}
+SUPERINSTRUCTION_STARTS = frozenset(pattern[0] for pattern in SUPERINSTRUCTIONS)
+
+# How much fuel an instruction burns, for the instructions that cost more than 1: calls, allocations and imports
+FUEL_COSTS = {
+    "BUILD_CONST_KEY_MAP": 3,
+    "BUILD_LIST": 3,
+    "BUILD_MAP": 3,
+    "BUILD_SET": 3,
+    "BUILD_SLICE": 3,
+    "BUILD_STRING": 3,
+    "BUILD_TUPLE": 3,
+    "CALL_FUNCTION": 5,
+    "CALL_FUNCTION_KW": 5,
+    "CALL_METHOD": 5,
+    "IMPORT_NAME": 10,
+    "LOAD_BUILD_CLASS": 3,
+    "MAKE_FUNCTION": 3
+}
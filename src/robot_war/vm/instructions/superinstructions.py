@@ -0,0 +1,101 @@
+"""
+Superinstructions: common runs of instructions fused into a single handler, so that the hot loops robots spend their
+time in take fewer trips around SandBox.run(). CodeBlock.build_dispatch() puts a superinstruction's handler in place of
+the first instruction's handler only; CodeBlock.code_lines still holds the original instructions, and so do the handlers
+after the first, so a jump into the middle of a run still works. Each superinstruction keeps the program counter where
+the original instructions would have it, so exceptions find the right handler and the right line number.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+import logging
+from typing import Any, Callable, List
+
+from robot_war.vm.instructions.data import UNBOUND
+
+try:
+    from robot_war.vm.exec_context import SandBox
+    from robot_war.vm.source_module import LazyModule
+except ImportError:
+    SandBox = LazyModule = None  # type: ignore
+
+# Constants:
+LOG = logging.getLogger(__name__)
+
+
+@dataclass(repr=False)
+class Superinstruction(ABC):
+    parts: List[Any]  # the CodeLines we run, each of its own subclass
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({', '.join(repr(part) for part in self.parts)})"
+
+    @abstractmethod
+    def exec(self, sandbox: SandBox):
+        """Run our parts, leaving the program counter where the last of them would have left it"""
+
+
+class LoadFastLoadFast(Superinstruction):
+    def exec(self, sandbox: SandBox):
+        first, second = self.parts
+        context = sandbox.context
+        value1 = context.fast_stack[first.operand]
+        value2 = context.fast_stack[second.operand]
+        if value1 is UNBOUND or value2 is UNBOUND:
+            # Let the original instructions raise
+            first.exec(sandbox)
+            context.pc += 1
+            second.exec(sandbox)
+        sandbox.push(value1)
+        sandbox.push(value2)
+        context.pc += 1
+
+
+@dataclass(repr=False)
+class LoadFastCompareConstJump(Superinstruction):
+    """LOAD_FAST, LOAD_CONST, COMPARE_OP, POP_JUMP_IF_FALSE: the test at the top of most loops"""
+    compare: Callable = field(init=False)
+
+    def __post_init__(self):
+        self.compare = self.parts[2].compare
+
+    def exec(self, sandbox: SandBox):
+        load_fast, load_const, _, jump = self.parts
+        context = sandbox.context
+        value = context.fast_stack[load_fast.operand]
+        if value is UNBOUND:
+            load_fast.exec(sandbox)
+        context.pc += 2  # now at the comparison, in case it raises
+        if self.compare(value, load_const.value):
+            context.pc += 1
+        else:
+            context.pc = jump.operand
+
+
+class LoadGlobalCallFunction(Superinstruction):
+    def exec(self, sandbox: SandBox):
+        load_global, call_function = self.parts
+        function = load_global.resolve(sandbox)
+        sandbox.context.pc += 1
+        if call_function.operand:
+            # The global is an argument, not the function
+            sandbox.push(function)
+            return call_function.exec(sandbox)
+        return call_function.call(sandbox, function)
+
+
+class LoadMethodCallMethod(Superinstruction):
+    def exec(self, sandbox: SandBox):
+        load_method, call_method = self.parts
+        obj = sandbox.pop()
+        if type(obj) is LazyModule:
+            return obj.load(sandbox)
+        method, instance = load_method.resolve(obj)
+        sandbox.context.pc += 1
+        if call_method.operand:
+            sandbox.push(method)
+            sandbox.push(instance)
+            return call_method.exec(sandbox)
+        if instance is None:
+            return call_method.call(sandbox, method)
+        return call_method.call(sandbox, method, instance)
@@ -0,0 +1,30 @@
+"""
+A dict that forgets its least recently used entries once it grows past a size limit, for the process-wide caches of
+code: a long-running host that keeps loading edited scripts would otherwise hold on to every version of them forever.
+"""
+
+from collections import OrderedDict
+import logging
+from typing import Any, Hashable
+
+# Constants:
+LOG = logging.getLogger(__name__)
+
+
+class LRUDict(OrderedDict):
+    """Only get() counts as using an entry: the caches look entries up with nothing else"""
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key: Hashable, value: Any):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.max_size:
+            self.popitem(last=False)
@@ -0,0 +1,181 @@
+"""
+A profiler for robot scripts: how many times each op-code ran and how long it took, and for each function, how many
+times it was called and how long it took, with and without the functions it called. Enabling a Profiler rebuilds every
+dispatch table with each handler wrapped to time it; disabling it builds them again without. So when we aren't
+profiling, it costs nothing at all.
+
+Code blocks are shared by every Playground in the process, so while a Profiler is enabled, the sandboxes of every
+Playground run the wrapped handlers, and enabling and disabling it rebuilds the dispatch tables of all of them. Setting
+playground only limits what is recorded: the other Playgrounds' instructions still pay for a check, and only one
+Profiler can be enabled at a time.
+
+A function's time only counts the instructions its own sandbox ran: time spent running other sandboxes while it was
+blocked or waiting for its turn isn't charged to it. Native functions called by an instruction are charged to that
+instruction. The function statistics are in the same form as cProfile's, so pstats.Stats(profiler) reads them, and
+dump_stats() writes a file that pstats and snakeviz can read.
+"""
+
+from dataclasses import dataclass, field
+import logging
+import marshal
+from pathlib import Path
+import sys
+from time import perf_counter
+from typing import Dict, List, Optional, TextIO, Tuple
+from weakref import WeakKeyDictionary
+
+from robot_war.vm import source_functions
+from robot_war.vm.instructions import Handler
+from robot_war.vm.source_functions import CodeBlock, TRAMPOLINES
+from robot_war.vm.source_module import CODE_BLOCKS
+
+try:
+    from robot_war.vm.exec_context import FunctionContext, Playground, SandBox
+except ImportError:
+    FunctionContext = Playground = SandBox = None  # type: ignore
+
+# Types:
+FunctionKey = Tuple[str, int, str]  # file name, first line and name, as pstats has them
+CallStats = List[float]  # primitive (non-recursive) calls, calls, exclusive time, inclusive time
+
+# Constants:
+LOG = logging.getLogger(__name__)
+
+
+@dataclass
+class Entry:
+    """A frame we've seen called and haven't seen return yet"""
+    frame: "FunctionContext"
+    key: FunctionKey
+    caller: Optional[FunctionKey]
+    start: float  # the sandbox's clock when it was called
+    exclusive: float = 0.0
+
+
+@dataclass
+class CallStack:
+    """What we know about one sandbox's calls"""
+    clock: float = 0.0  # time spent running the sandbox's instructions
+    entries: List[Entry] = field(default_factory=list)
+    active: Dict[FunctionKey, int] = field(default_factory=dict)  # entries per function, to spot recursion
+
+
+@dataclass
+class Profiler:
+    playground: Optional["Playground"] = None  # only profile this Playground's sandboxes, if set
+    op_codes: Dict[str, List[float]] = field(default_factory=dict)  # op-code -> [count, time]
+    functions: Dict[FunctionKey, CallStats] = field(default_factory=dict)
+    callers: Dict[FunctionKey, Dict[FunctionKey, CallStats]] = field(default_factory=dict)
+    stacks: "WeakKeyDictionary[SandBox, CallStack]" = field(default_factory=WeakKeyDictionary)
+    stats: Dict[FunctionKey, tuple] = field(default_factory=dict)  # filled in by create_stats(), for pstats
+    wrapped: Dict[int, CodeBlock] = field(default_factory=dict)  # id -> each code block whose handlers we wrapped
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disable()
+
+    def enable(self):
+        """Start profiling, in every Playground: see the module's docstring"""
+        assert source_functions.PROFILER is None, "only one Profiler can be enabled at a time"
+        source_functions.PROFILER = self
+        code_blocks = list(CODE_BLOCKS.values()) + [function.code_block for function in TRAMPOLINES.values()]
+        rebuild_dispatch(code_blocks)
+
+    def disable(self):
+        """Stop profiling: the calls still running are counted as if they returned now"""
+        if source_functions.PROFILER is self:
+            source_functions.PROFILER = None
+            rebuild_dispatch(list(self.wrapped.values()))  # including any that CODE_BLOCKS has since forgotten
+            self.wrapped.clear()
+            for stack in self.stacks.values():
+                while stack.entries:
+                    self.finish(stack)
+
+    def wrap(self, code_block: CodeBlock, op_name: str, handler: Handler) -> Handler:
+        """Wrap one of code_block's handlers to count and time it"""
+        self.wrapped[id(code_block)] = code_block
+        op_stats = self.op_codes.setdefault(op_name, [0, 0.0])
+
+        def profiled(sandbox: SandBox):
+            if self.playground is not None and sandbox.playground is not self.playground:
+                return handler(sandbox)
+            stack = self.sync(sandbox)
+            start = perf_counter()
+            try:
+                return handler(sandbox)
+            finally:
+                elapsed = perf_counter() - start
+                op_stats[0] += 1
+                op_stats[1] += elapsed
+                stack.clock += elapsed
+                stack.entries[-1].exclusive += elapsed
+                if not sandbox.call_stack:
+                    while stack.entries:  # the outermost function returned
+                        self.finish(stack)
+
+        return profiled
+
+    def sync(self, sandbox: SandBox) -> CallStack:
+        """
+        Bring our entries for a sandbox in line with its call stack. Frames are pushed and popped by instructions, and
+        by exceptions unwinding, so we catch up on the calls and returns since the sandbox's last instruction.
+        """
+        stack = self.stacks.get(sandbox)
+        if stack is None:
+            stack = self.stacks[sandbox] = CallStack()
+        call_stack = sandbox.call_stack
+        entries = stack.entries
+        while entries and (len(entries) > len(call_stack) or entries[-1].frame is not call_stack[len(entries) - 1]):
+            self.finish(stack)
+        while len(entries) < len(call_stack):
+            frame = call_stack[len(entries)]
+            code_block = frame.function.code_block
+            key = (code_block.file_name or "~", code_block.first_line(), frame.function.name)
+            entries.append(Entry(frame, key, entries[-1].key if entries else None, stack.clock))
+            stack.active[key] = stack.active.get(key, 0) + 1
+        return stack
+
+    def finish(self, stack: CallStack):
+        """The top entry's call returned: add it to the statistics"""
+        entry = stack.entries.pop()
+        stack.active[entry.key] -= 1
+        recursive = stack.active[entry.key] > 0  # the outermost call's inclusive time already covers this one
+        totals = [self.functions.setdefault(entry.key, [0, 0, 0.0, 0.0])]
+        if entry.caller is not None:
+            totals.append(self.callers.setdefault(entry.key, {}).setdefault(entry.caller, [0, 0, 0.0, 0.0]))
+        for call_stats in totals:
+            call_stats[1] += 1
+            call_stats[2] += entry.exclusive
+            if not recursive:
+                call_stats[0] += 1
+                call_stats[3] += stack.clock - entry.start
+
+    def create_stats(self):
+        """Fill in stats, as pstats expects"""
+        self.stats = {key: (*call_stats, {caller: tuple(caller_stats)
+                                          for caller, caller_stats in self.callers.get(key, {}).items()})
+                      for key, call_stats in self.functions.items()}
+
+    def dump_stats(self, path: Path):
+        """Write our function statistics in pstats' marshalled format"""
+        self.create_stats()
+        with open(path, "wb") as stats_file:
+            marshal.dump(self.stats, stats_file)
+
+    def print_op_codes(self, stream: Optional[TextIO] = None):
+        """Print the op-codes by the time spent in them, most first"""
+        stream = sys.stdout if stream is None else stream
+        print(f"{'op-code':40} {'count':>10} {'total ms':>10} {'per call us':>12}", file=stream)
+        for op_name, (count, total) in sorted(self.op_codes.items(), key=lambda item: -item[1][1]):
+            if count:
+                print(f"{op_name:40} {count:10} {total * 1e3:10.3f} {total / count * 1e6:12.3f}", file=stream)
+
+
+def rebuild_dispatch(code_blocks: List[CodeBlock]):
+    """Build the code blocks' dispatch tables again, now that a Profiler has been enabled or disabled"""
+    for code_block in code_blocks:
+        if code_block.handlers:
+            code_block.build_dispatch(code_block.fused)
@@ -0,0 +1,108 @@
+"""
+The scheduler decides which of a Playground's sandboxes (its robot's threads) runs next. Sandboxes that can run wait
+their turn in a round-robin ready queue. Each turn, a sandbox runs up to the quantum times its priority in instructions,
+weighted by their fuel cost, and never more than the fuel its robot has left for the tick.
+Sandboxes waiting for a Waiter sit in the blocked set until the Waiter wakes them. Sandboxes waiting for a
+BlockGenerator sit in the worker queue, and their generators are advanced once per step. Sleeping sandboxes sit in a
+heap of timers, costing nothing until they're due. Every move between these is O(1), or O(log n) for the timers, so
+a robot with many threads doesn't make each step walk and shift long lists.
+
+Sleeps are measured in game time, not by the host's clock: each tick is CONSTANTS.TIMING.FRAMES long, however long it
+really took, so a sleeping robot gets as much done on a slow host as on a fast one. Game time only moves on between
+ticks, so during a tick only sleep(0) comes due: those sandboxes are woken between rounds, and other sleepers at the
+start of the tick they're due in.
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from heapq import heappop, heappush
+from itertools import count
+import logging
+from typing import Deque, Iterator, List, Set, Tuple
+
+from robot_war.constants import CONSTANTS
+from robot_war.signals import BlockGenerator, BlockFunction, BlockTimer, Signal
+
+try:
+    from robot_war.vm.exec_context import SandBox
+except ImportError:
+    SandBox = None  # type: ignore
+
+# Constants:
+LOG = logging.getLogger(__name__)
+
+
+@dataclass
+class Scheduler:
+    quantum: int = CONSTANTS.VM.QUANTUM  # instructions a sandbox of priority 1 runs before the next one gets a turn
+    ready: Deque["SandBox"] = field(default_factory=deque)
+    blocked: Set["SandBox"] = field(default_factory=set)
+    workers: Deque[BlockGenerator] = field(default_factory=deque)
+    timers: List[Tuple[float, int, "SandBox"]] = field(default_factory=list)  # heap of (wake_at, tie breaker, sandbox)
+    tie_breakers: Iterator[int] = field(default_factory=count)
+    time: float = 0.0  # game time, in seconds
+
+    @property
+    def busy(self) -> bool:
+        """Is there anything left to run? Sandboxes blocked on Waiters only run again once something else runs."""
+        return bool(self.ready or self.workers or self.timers)
+
+    def wake_timers(self):
+        """Wake the sleeping sandboxes that are due"""
+        timers = self.timers
+        while timers and timers[0][0] <= self.time:
+            _, _, sandbox = heappop(timers)
+            sandbox.push(None)  # what sleep() returns
+            self.ready.append(sandbox)
+
+    def wake(self, sandbox: "SandBox"):
+        """Make a sandbox ready to run: a new one, or one that was blocked"""
+        self.blocked.discard(sandbox)
+        self.ready.append(sandbox)
+
+    def step_workers(self):
+        """Advance each worker's generator once, and wake the sandboxes whose generators are done"""
+        workers = self.workers
+        for _ in range(len(workers)):
+            worker = workers.popleft()
+            try:
+                next(worker.generator)
+            except StopIteration as stop:
+                assert worker.sandbox
+                worker.sandbox.push(stop.value)
+                self.ready.append(worker.sandbox)
+            else:
+                workers.append(worker)
+
+    def run_round(self, fuel: int) -> int:
+        """
+        Give every ready sandbox one turn, out of fuel, and return what's left of it. Sandboxes woken during the round
+        get their turn in the next. If the fuel runs out first, the sandboxes that missed their turn are first in line
+        next time.
+        """
+        ready = self.ready
+        for _ in range(len(ready)):
+            if fuel <= 0:
+                break
+            sandbox = ready.popleft()
+            budget = min(self.quantum * sandbox.priority, fuel)
+            signal = sandbox.run(budget)
+            fuel -= budget - sandbox.budget_left
+            if signal is None:
+                ready.append(sandbox)
+            else:
+                self.unready(sandbox, signal)
+        return fuel
+
+    def unready(self, sandbox: "SandBox", signal: Signal):
+        """
+        Put a sandbox that stopped running where it belongs: the timers, the worker queue, the blocked set, or nowhere
+        if it's done
+        """
+        if isinstance(signal, BlockTimer):
+            heappush(self.timers, (self.time + signal.delay, next(self.tie_breakers), sandbox))
+        elif isinstance(signal, BlockGenerator):
+            signal.sandbox = sandbox
+            self.workers.append(signal)
+        elif isinstance(signal, BlockFunction):
+            self.blocked.add(sandbox)  # its Waiter will wake it
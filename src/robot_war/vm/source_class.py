@@ -1,6 +1,6 @@
 from dataclasses import dataclass, field
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, FrozenSet
 
 from robot_war.vm.get_name import GetName
 from robot_war.vm.source_functions import Function
@@ -23,62 +23,177 @@ LOG = logging.getLogger(__name__)
 #   * Execute the __init__ function
 #   * Return the instance
 
-@dataclass
+@dataclass(eq=False)
 class SourceClass(GetName):
-    parent_classes: List["SourceClass"] = field(default_factory=list)
+    parent_classes: List["SourceClass"] = field(default_factory=list)  # API classes appear here as instances
     module: Optional[Module] = None
+    mro: List[Any] = field(init=False, repr=False)  # method resolution order: us, then our ancestors
+    ancestor_ids: FrozenSet[int] = field(init=False, repr=False)  # id() of everything in mro
+    subclasses: List["SourceClass"] = field(default_factory=list, init=False, repr=False)  # all descendants
+    cache: Dict[str, Any] = field(default_factory=dict, init=False, repr=False)  # names already found in mro
+    init_function: Any = field(default=None, init=False, repr=False)  # our __init__, or None if we haven't one...
+    init_known: bool = field(default=False, init=False, repr=False)  # ...once we've looked it up
+    instance_shape: "Shape" = field(init=False, repr=False)  # the shape of our instances before they get attributes
+
+    def __post_init__(self):
+        self.instance_shape = Shape({})
+        self.mro = linearize(self)
+        self.ancestor_ids = frozenset(id(cls) for cls in self.mro)
+        for ancestor in self.mro[1:]:
+            if isinstance(ancestor, SourceClass):
+                ancestor.subclasses.append(self)
 
     def get_name(self, name: str):
-        # Do we have the name?
-        if name in self.name_dict:
-            return self.name_dict[name]
+        # Have we looked this up before?
+        try:
+            return self.cache[name]
+        except KeyError:
+            pass
+
+        # No, do we or any of our ancestors have the name?
+        for cls in self.mro:
+            if isinstance(cls, SourceClass):
+                if name in cls.name_dict:
+                    value = cls.name_dict[name]
+                    break
+            else:
+                try:
+                    value = cls.get_name(name)
+                    break
+                except (KeyError, AttributeError):
+                    pass
+        else:
+            # Try the module's namespace. That has its own caching, so we don't cache what we find there.
+            if self.module:
+                return self.module.get_name(name)
+            else:
+                raise KeyError(f"{name} not found")
+
+        self.cache[name] = value
+        return value
 
-        # No, do any of our parents?
-        for parent in self.parent_classes:
+    def set_name(self, name: str, value: Any):
+        self.name_dict[name] = value
+        self.invalidate()
+
+    def set_attr(self, name: str, value: Any):
+        self.name_dict[name] = value
+        self.invalidate()
+
+    def del_name(self, name: str):
+        del self.name_dict[name]
+        self.invalidate()
+
+    def invalidate(self):
+        """Our names changed, so anything we or our descendants cached may be wrong"""
+        for source_class in [self] + self.subclasses:
+            source_class.cache.clear()
+            source_class.init_known = False
+
+    def get_init(self):
+        """Returns our __init__ function, or None if we don't have one"""
+        if not self.init_known:
             try:
-                return parent.get_name(name)
+                self.init_function = self.get_name("__init__")
             except KeyError:
-                pass
-
-        # Try the module's namespace
-        if self.module:
-            return self.module.get_name(name)
+                self.init_function = None
+            self.init_known = True
+        return self.init_function
+
+
+def linearize(source_class: SourceClass) -> List[Any]:
+    """The C3 linearization Python uses for its method resolution order. API classes count as having no parents."""
+    sequences = [parent.mro[:] if isinstance(parent, SourceClass) else [parent]
+                 for parent in source_class.parent_classes] + [source_class.parent_classes[:]]
+    mro: List[Any] = [source_class]
+    while True:
+        sequences = [sequence for sequence in sequences if sequence]
+        if not sequences:
+            return mro
+
+        # The next class is the first head that isn't in the tail of any sequence
+        for sequence in sequences:
+            head = sequence[0]
+            if not any(head is cls for other in sequences for cls in other[1:]):
+                break
         else:
-            raise KeyError(f"{name} not found")
+            raise TypeError("Cannot create a consistent method resolution order (MRO)")
+
+        mro.append(head)
+        for sequence in sequences:
+            if sequence[0] is head:
+                del sequence[0]
+
 
+class Shape:
+    """
+    The layout of an instance's attributes: which slot each one is in. Instances of a class that set the same attributes
+    in the same order, which is nearly all of them, share a shape. That lets LOAD_ATTR and STORE_ATTR cache a slot
+    index for a shape rather than look the name up every time.
+    """
+    __slots__ = ("slots", "transitions")
 
-@dataclass
-class Constructor(Function):
-    source_class: Optional[SourceClass] = None
+    def __init__(self, slots: Dict[str, int]):
+        self.slots = slots  # attribute name -> slot index
+        self.transitions: Dict[str, Shape] = {}  # attribute name -> the shape we become when it's added
 
+    def __repr__(self):
+        return f"Shape({list(self.slots)})"
 
-@dataclass
-class SourceInstance(GetName):
-    source_class: Optional[SourceClass] = None
-    values: Dict[str, Any] = field(default_factory=dict)
+    def add_attr(self, name: str) -> "Shape":
+        """Returns the shape of an instance like ours once attribute name is added"""
+        shape = self.transitions.get(name)
+        if shape is None:
+            shape = self.transitions[name] = Shape({**self.slots, name: len(self.slots)})
+        return shape
+
+
+class SourceInstance:
+    __slots__ = ("source_class", "shape", "slots")
+    version = None  # not a namespace to cache lookups in: see LoadName
+
+    def __init__(self, source_class: SourceClass):
+        self.source_class = source_class
+        self.shape: Shape = source_class.instance_shape
+        self.slots: List[Any] = []
+
+    def __repr__(self):
+        return f"SourceInstance({self.source_class.name_dict.get('__name__')})"
 
     def __getattr__(self, item):
         return self.get_name(item)
 
     def set_attr(self, name: str, value: Any):
-        self.values[name] = value
+        index = self.shape.slots.get(name)
+        if index is None:
+            self.shape = self.shape.add_attr(name)
+            self.slots.append(value)
+        else:
+            self.slots[index] = value
 
     def get_attr(self, name: str):
-        if name in self.values:
-            return self.values[name]
+        index = self.shape.slots.get(name)
+        if index is not None:
+            return self.slots[index]
         else:
             obj = self.get_name(name)
-            return BoundMethod(instance=self, **obj.__dict__) if isinstance(obj, Function) else obj
+            return BoundMethod(obj, self) if isinstance(obj, Function) else obj
 
     def get_method(self, name: str):
         attr = self.get_name(name)
-        return attr if callable(attr) else BoundMethod(instance=self, **attr.__dict__)
+        return attr if callable(attr) else BoundMethod(attr, self)
 
     def get_name(self, name: str):
-        assert self.source_class
-        return self.name_dict[name] if name in self.name_dict else self.source_class.get_name(name)
+        return self.source_class.get_name(name)
+
+
+class BoundMethod:
+    """A method bound to its instance. LOAD_METHOD doesn't need one: it passes the instance straight to the call."""
+    __slots__ = ("function", "instance")
 
+    def __init__(self, function: Function, instance: SourceInstance):
+        self.function = function
+        self.instance = instance
 
-@dataclass
-class BoundMethod(Function):
-    instance: Optional[SourceInstance] = None
+    def __repr__(self):
+        return f"BoundMethod({self.function.name}, {self.instance!r})"
@@ -1,8 +1,9 @@
 from dataclasses import dataclass, field
 import logging
-from typing import Dict, Any, Optional, List, Callable, Tuple
+from typing import Dict, Any, Optional, List, Callable, Tuple, Hashable
 
-from robot_war.vm.instructions import CodeLine
+from robot_war.vm.instructions import CodeLine, Handler, traced, LOG as INSTRUCTION_LOG
+from robot_war.vm.instructions.data import UNBOUND
 
 try:
     from robot_war.vm.exec_context import FunctionContext, SandBox
@@ -15,190 +16,237 @@ CodeDict = Dict[str, "CodeBlock"]
 
 # Constants:
 LOG = logging.getLogger(__name__)
+PROFILER: Optional[Any] = None  # the enabled robot_war.vm.profiler.Profiler: build_dispatch() wraps handlers for it
+
+
+class BindingPlan:
+    """How to bind a call's arguments to a new frame's fast_stack, worked out once per code block"""
+    __slots__ = ("num_params", "slots", "unbound")
+
+    def __init__(self, num_params: int, num_locals: int, param_names: List[str]):
+        self.num_params = num_params
+        self.slots = {name: index for index, name in enumerate(param_names)}  # keyword -> index in fast_stack
+        self.unbound = [UNBOUND] * (num_locals - num_params)  # the rest of the local variables
+
+    def bind(self, args: tuple, kwargs: Dict[str, Any], default_args: tuple) -> List[Any]:
+        num_args = len(args)
+        num_params = self.num_params
+        if num_args == num_params and not kwargs:
+            return [*args, *self.unbound]
+
+        # Positional arguments, then placeholders for the parameters without defaults, then the defaults we need
+        fast_stack = list(args)
+        if num_args < num_params:
+            first_default = num_params - len(default_args)
+            if num_args < first_default:
+                fast_stack.extend([None] * (first_default - num_args))
+                fast_stack.extend(default_args)
+            else:
+                fast_stack.extend(default_args[num_args - first_default:])
+
+        # Keyword arguments
+        slots = self.slots
+        for name, value in kwargs.items():
+            index = slots.get(name)
+            if index is not None:
+                fast_stack[index] = value
+
+        fast_stack.extend(self.unbound[len(fast_stack) - num_params:])
+        return fast_stack
 
 
 @dataclass(repr=False)
 class CodeBlock:
-    code_lines: Dict[int, CodeLine] = field(default_factory=dict)
-    module: Optional[Module] = None
+    code_lines: List[CodeLine] = field(default_factory=list)  # indexed by program counter, not by byte offset
+    file_name: Optional[str] = None
     num_params: int = 0
+    num_locals: int = 0  # size of a frame's fast_stack: parameters first, then the other local variables
+    num_cells: int = 0  # local variables that nested functions close over, which live in the frame's deref list
+    cell_params: Dict[int, int] = field(default_factory=dict)  # cell index -> index of the parameter that fills it
     param_names: List[str] = field(default_factory=list)
-    constants: Dict[int, Any] = field(default_factory=dict)
+    handlers: List[Handler] = field(default_factory=list)
+    costs: List[int] = field(default_factory=list)  # fuel each handler burns, indexed like handlers
+    binding: Optional[BindingPlan] = None
+    fused: bool = True  # how build_dispatch() was last called, so that the profiler can build the same table again
 
     def __repr__(self):
-        module_name = None if self.module is None else self.module.name
-        return f"CodeBlock(module={module_name}, {len(self.code_lines)} lines, {len(self.constants)} constants)"
+        return f"CodeBlock({self.file_name}, {len(self.code_lines)} lines)"
+
+    def binding_plan(self) -> BindingPlan:
+        """Our binding plan, made the first time we're called, once the parameters are all known"""
+        if self.binding is None:
+            self.binding = BindingPlan(self.num_params, self.num_locals, self.param_names)
+        return self.binding
+
+    def build_dispatch(self, fuse: bool = True):
+        """
+        Build the dispatch table that SandBox.run() runs: one handler per instruction, so that executing an op is just
+        an index and a call. Whether to trace op-codes is decided here, once, rather than checked on every instruction.
+        When we aren't tracing, and fuse is set, common runs of instructions are fused into superinstructions. A
+        superinstruction burns the fuel of all the instructions it runs. When a Profiler is enabled, each handler,
+        traced or not, is wrapped to time it; otherwise profiling costs nothing.
+        """
+        from robot_war.vm.instructions.op_code_dict import FUEL_COSTS, SUPERINSTRUCTIONS, SUPERINSTRUCTION_STARTS
+        self.fused = fuse
+        self.costs = [FUEL_COSTS.get(code_line.op_code, 1) for code_line in self.code_lines]
+        op_codes = tuple(code_line.op_code for code_line in self.code_lines)
+        op_names = list(op_codes)  # what the profiler calls each handler
+        if INSTRUCTION_LOG.isEnabledFor(logging.DEBUG):
+            self.handlers = [traced(code_line) for code_line in self.code_lines]
+        else:
+            self.handlers = [code_line.exec for code_line in self.code_lines]
+            if fuse:
+                for index, op_code in enumerate(op_codes):
+                    if op_code not in SUPERINSTRUCTION_STARTS:
+                        continue
+                    for pattern, fused_class in SUPERINSTRUCTIONS.items():
+                        if op_codes[index:index + len(pattern)] == pattern:
+                            self.handlers[index] = fused_class(self.code_lines[index:index + len(pattern)]).exec
+                            self.costs[index] = sum(FUEL_COSTS.get(part, 1) for part in pattern)
+                            op_names[index] = "+".join(pattern)
+                            break
+
+        if PROFILER is not None:
+            self.handlers = [PROFILER.wrap(self, op_name, handler)
+                             for op_name, handler in zip(op_names, self.handlers)]
+
+    def first_line(self) -> int:
+        """The line number our code starts at, or 0 if we don't know"""
+        return next((code_line.line_number for code_line in self.code_lines if code_line.line_number is not None), 0)
 
 
 # The following code gives us a fancy way to create a function from byte codes on-the-fly. It works like this:
 #
-# with Function("foo", ["arg1", "arg2"]) as foo:
-#     foo.LOAD_CONSTANT("bar")
+# with FunctionCreator("foo", ["arg1", "arg2"]) as foo:
+#     foo.LOAD_CONST(bar)
 #     foo.LOAD_FAST("arg1")
 #     foo.LOAD_FAST("arg2")
 #     foo.CALL_FUNCTION(2)
 #     foo.RETURN_VALUE()
 #
-# That makes function foo which will accept arg1 and arg2, and will call function bas with them before returning the
-# result.
+# That makes function foo which will accept arg1 and arg2, and will call function bar with them before returning the
+# result. The VM uses these for its own multistep operations, like importing a module or starting a thread. Those are
+# built once for each shape of arguments and kept as trampolines: see trampoline() below.
 
-@dataclass
-class ConstMember:
-    """Used below to add LOAD_CONST to the function creator"""
-    function: "Function"
-    name: str
+class Function:
+    """
+    A function the VM can run. MAKE_FUNCTION creates one every time a def or lambda runs, so this is a small __slots__
+    class: the code block is shared by every function made from the same code, in every Playground; only the module
+    (our globals), defaults and closure are our own.
+    """
+    __slots__ = ("name", "code_block", "module", "default_args", "closure")
 
-    def __call__(self, note: str, label: Optional[str] = None) -> int:
-        from robot_war.vm.exec_context import CODE_STEP
-        from robot_war.vm.instructions.op_code_dict import OP_CODE_CLASSES
-        code_lines = self.function.code_block.code_lines
-        offset = len(code_lines) * CODE_STEP
-        if note not in self.function.constants:
-            self.function.constants.append(note)
-        instr_class = OP_CODE_CLASSES[self.name]
-        code_lines[offset] = instr_class(None, offset, self.name, self.function.constants.index(note), note)
-        if label:
-            self.function.labels[label] = offset
-        return offset
+    def __init__(self, name: str, code_block: Optional[CodeBlock] = None, module: Optional[Module] = None,
+                 default_args: tuple = (), closure: tuple = ()):
+        self.name = name
+        self.code_block = CodeBlock() if code_block is None else code_block
+        self.module = module
+        self.default_args = default_args
+        self.closure = closure
+
+    def __repr__(self):
+        return f"Function({self.name})"
 
+    def function_context(self, source_class, *args) -> FunctionContext:
+        """Create a context for executing this function"""
+        from robot_war.vm.exec_context import FunctionContext
+        return FunctionContext(self, list(args), source_class)
 
-@dataclass
-class FastMember:
-    """Used below to add LOAD_FAST to the function creator"""
-    function: "Function"
-    name: str
 
-    def __call__(self, fast: str, label: Optional[str] = None) -> int:
-        from robot_war.vm.exec_context import CODE_STEP
+class FunctionCreator(Function):
+    """A Function built from byte codes on-the-fly: see above"""
+    def __init__(self, name: str, arg_names: Optional[List[str]] = None):
+        super().__init__(name)
         from robot_war.vm.instructions.op_code_dict import OP_CODE_CLASSES
-        code_lines = self.function.code_block.code_lines
-        offset = len(code_lines) * CODE_STEP
-        if fast not in self.function.arg_names:
-            self.function.arg_names.append(fast)
-        instr_class = OP_CODE_CLASSES[self.name]
-        code_lines[offset] = instr_class(None, offset, self.name, self.function.arg_names.index(fast), fast)
+        self.op_code_classes = OP_CODE_CLASSES
+        self.arg_names: List[str] = [] if arg_names is None else arg_names
+        self.constants: List[str] = []
+        self.labels: Dict[str, int] = {}
+        self.redo: List[Tuple[int, str]] = []
+
+    def emit(self, op_code: str, operand: int = 0, note: Optional[str] = None, value: Any = None,
+             label: Optional[str] = None) -> int:
+        """Append an instruction and return its offset"""
+        code_lines = self.code_block.code_lines
+        offset = len(code_lines)
+        code_lines.append(self.op_code_classes[op_code](None, offset, op_code, operand, note, value))
         if label:
-            self.function.labels[label] = offset
+            self.labels[label] = offset
         return offset
 
+    def LOAD_CONST(self, value: Any, label: Optional[str] = None) -> int:
+        note = repr(value)
+        if note not in self.constants:
+            self.constants.append(note)
+        return self.emit("LOAD_CONST", self.constants.index(note), note, value, label)
 
-@dataclass
-class NoteMember:
-    """Used below to add LOAD_NAME and LOAD_MODULE_FILE_3 to the function creator"""
-    function: "Function"
-    name: str
+    def LOAD_FAST(self, fast: str, label: Optional[str] = None) -> int:
+        if fast not in self.arg_names:
+            self.arg_names.append(fast)
+        return self.emit("LOAD_FAST", self.arg_names.index(fast), fast, label=label)
 
-    def __call__(self, note: str, label: Optional[str] = None) -> int:
-        from robot_war.vm.exec_context import CODE_STEP
-        from robot_war.vm.instructions.op_code_dict import OP_CODE_CLASSES
-        code_lines = self.function.code_block.code_lines
-        offset = len(code_lines) * CODE_STEP
-        instr_class = OP_CODE_CLASSES[self.name]
-        code_lines[offset] = instr_class(None, offset, self.name, 0, note)
-        if label:
-            self.function.labels[label] = offset
+    def LOAD_NAME(self, note: str, label: Optional[str] = None) -> int:
+        return self.emit("LOAD_NAME", 0, note, label=label)
+
+    def POP_JUMP_IF_FALSE(self, target: str, label: Optional[str] = None) -> int:
+        offset = self.emit("POP_JUMP_IF_FALSE", self.labels.get(target, 0), target, label=label)
+        if target not in self.labels:
+            self.redo.append((offset, target))
         return offset
 
+    def BUILD_LIST(self, operand: int, label: Optional[str] = None) -> int:
+        return self.emit("BUILD_LIST", operand, label=label)
 
-@dataclass
-class RelativeMember:
-    """Used below to add POP_JUMP_IF_FALSE to the function creator"""
-    function: "Function"
-    name: str
+    def BUILD_TUPLE(self, operand: int, label: Optional[str] = None) -> int:
+        return self.emit("BUILD_TUPLE", operand, label=label)
 
-    def __call__(self, target: str, label: Optional[str] = None, offset: Optional[int] = None) -> int:
-        from robot_war.vm.exec_context import CODE_STEP
-        from robot_war.vm.instructions.op_code_dict import OP_CODE_CLASSES
-        code_lines = self.function.code_block.code_lines
-        if offset is None:
-            offset = len(code_lines) * CODE_STEP
-        instr_class = OP_CODE_CLASSES[self.name]
-        code_lines[offset] = instr_class(None, offset, self.name, self.function.labels.get(target, 0), target)
-        if target not in self.function.labels:
-            self.function.redo.append((offset, self, target))
-        if label:
-            self.function.labels[label] = offset
-        return offset
+    def CALL_FUNCTION(self, operand: int, label: Optional[str] = None) -> int:
+        return self.emit("CALL_FUNCTION", operand, label=label)
 
+    def CALL_FUNCTION_KW(self, operand: int, label: Optional[str] = None) -> int:
+        return self.emit("CALL_FUNCTION_KW", operand, label=label)
 
-@dataclass
-class OperandMember:
-    """
-    Used below to add the following to the function creator:
-        BUILD_LIST, BUILD_TUPLE, CALL_FUNCTION, CALL_FUNCTION_KW, LOAD_MODULE_FILE_1, LOAD_MODULE_FILE_2, LOAD_SUBSCR,
-        POP_TOP, RAISE_VARARGS, and RETURN_VALUE
-    """
-    function: "Function"
-    name: str
+    def LOAD_MODULE_FILE_1(self, label: Optional[str] = None) -> int:
+        return self.emit("LOAD_MODULE_FILE_1", label=label)
 
-    def __call__(self, operand: int = 0, label: Optional[str] = None) -> int:
-        from robot_war.vm.exec_context import CODE_STEP
-        from robot_war.vm.instructions.op_code_dict import OP_CODE_CLASSES
-        code_lines = self.function.code_block.code_lines
-        offset = len(code_lines) * CODE_STEP
-        instr_class = OP_CODE_CLASSES[self.name]
-        code_lines[offset] = instr_class(None, offset, self.name, operand, None)
-        return offset
+    def LOAD_MODULE_FILE_2(self, label: Optional[str] = None) -> int:
+        return self.emit("LOAD_MODULE_FILE_2", label=label)
 
+    def LOAD_MODULE_FILE_3(self, label: Optional[str] = None) -> int:
+        return self.emit("LOAD_MODULE_FILE_3", label=label)
 
-@dataclass
-class Function:
-    name: str
-    arg_names: List[str] = field(default_factory=list)
-    code_block: CodeBlock = field(default_factory=CodeBlock)
-    default_args: tuple = ()
-    closure: tuple = ()
-    constants: List[str] = field(default_factory=list)
-    labels: Dict[str, int] = field(default_factory=dict)
-    redo: List[Tuple[int, Callable, str]] = field(default_factory=list)
-    arguments: Dict[str, Any] = field(default_factory=dict)
-
-    def add_const_member(self, name: str):
-        """Used below to add LOAD_CONST to the function creator"""
-        setattr(self, name, ConstMember(self, name))
-
-    def add_fast_member(self, name: str):
-        """Used below to add LOAD_FAST to the function creator"""
-        setattr(self, name, FastMember(self, name))
-
-    def add_note_member(self, name: str):
-        """Used below to add LOAD_NAME and LOAD_MODULE_FILE_3 to the function creator"""
-        setattr(self, name, NoteMember(self, name))
-
-    def add_operand_member(self, name: str):
-        """
-        Used below to add the following to the function creator:
-            BUILD_LIST, BUILD_TUPLE, CALL_FUNCTION, CALL_FUNCTION_KW, LOAD_MODULE_FILE_1, LOAD_MODULE_FILE_2,
-            LOAD_SUBSCR, POP_TOP, RAISE_VARARGS, and RETURN_VALUE
-        """
-        setattr(self, name, OperandMember(self, name))
+    def LOAD_SUBSCR(self, label: Optional[str] = None) -> int:
+        return self.emit("LOAD_SUBSCR", label=label)
+
+    def POP_TOP(self, label: Optional[str] = None) -> int:
+        return self.emit("POP_TOP", label=label)
+
+    def RAISE_VARARGS(self, operand: int, label: Optional[str] = None) -> int:
+        return self.emit("RAISE_VARARGS", operand, label=label)
 
-    def add_absolute_branch(self, name: str):
-        """Used below to add POP_JUMP_IF_FALSE to the function creator"""
-        setattr(self, name, RelativeMember(self, name))
+    def RETURN_VALUE(self, label: Optional[str] = None) -> int:
+        return self.emit("RETURN_VALUE", label=label)
 
     # Function creator gizmo
     def __enter__(self):
-        self.add_const_member("LOAD_CONST")
-        self.add_fast_member("LOAD_FAST")
-        self.add_note_member("LOAD_NAME")
-        self.add_note_member("LOAD_MODULE_FILE_3")
-        self.add_absolute_branch("POP_JUMP_IF_FALSE")
-        for name in ["BUILD_LIST", "BUILD_TUPLE", "CALL_FUNCTION", "CALL_FUNCTION_KW", "LOAD_MODULE_FILE_1",
-                     "LOAD_MODULE_FILE_2", "LOAD_SUBSCR", "POP_TOP", "RAISE_VARARGS", "RETURN_VALUE"]:
-            self.add_operand_member(name)
         self.code_block.num_params = len(self.arg_names)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        for offset, func, target in self.redo:
-            func(target, offset=offset)
+        code_lines = self.code_block.code_lines
+        for offset, target in self.redo:
+            code_lines[offset].operand = self.labels[target]
+        self.code_block.num_locals = len(self.arg_names)
+        self.code_block.build_dispatch(fuse=False)
+
+
+# Trampolines, keyed by whatever decides their shape
+TRAMPOLINES: Dict[Hashable, FunctionCreator] = {}
 
-    def function_context(self, source_class, *args) -> FunctionContext:
-        """Create a context for executing this function"""
-        from robot_war.vm.exec_context import FunctionContext
-        return FunctionContext(self, {index: arg for index, arg in enumerate(args)}, source_class)
 
-    def call_in_sandbox(self, sandbox: "SandBox"):
-        self.arg_names = list(self.arguments.keys())
-        sandbox.call_function(self, *tuple(self.arguments.values()))
+def trampoline(key: Hashable, build: Callable[[], FunctionCreator]) -> FunctionCreator:
+    """Return the trampoline stored under key, calling build() to create it the first time"""
+    function = TRAMPOLINES.get(key)
+    if function is None:
+        function = TRAMPOLINES[key] = build()
+    return function
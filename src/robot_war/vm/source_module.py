@@ -1,36 +1,68 @@
-from dataclasses import dataclass, field
-from dis import get_instructions, code_info
+from dis import get_instructions, hasjabs, hasjrel
 from inspect import getsource
 import logging
 from pathlib import Path
 import re
-from typing import Optional, List, Callable, Tuple
+from typing import Any, Dict, Optional, List, Callable, Tuple
 
-from robot_war.constants import CODE_CLASS
+from robot_war.constants import CONSTANTS, CODE_CLASS
 from robot_war.vm.built_ins import BUILT_INS
-from robot_war.vm.get_name import GetName
-from robot_war.vm.source_functions import Function, CodeBlock
-
-# Constants:
-LOG = logging.getLogger(__name__)
-SEARCH_NUM_ARGS = re.compile(r"^Argument count:\s+(\d+)", re.MULTILINE)
-SEARCH_VAR_NAMES1 = re.compile(r"^Variable names:(.*)", re.MULTILINE | re.DOTALL)
-SEARCH_VAR_NAMES2 = re.compile(r"(.*?)^\S", re.MULTILINE | re.DOTALL)
-SEARCH_VAR_NAMES3 = re.compile(r"(\d+): (.+)")
+from robot_war.vm.get_name import VersionedNames
+from robot_war.vm.lru_dict import LRUDict
+from robot_war.signals import Signal
+from robot_war.vm.source_functions import Function, FunctionCreator, CodeBlock
 
+try:
+    from robot_war.vm.exec_context import SandBox
+except ImportError:
+    SandBox = None  # type: ignore
 
-@dataclass(repr=False)
-class Module(GetName, Function):
-    path: Optional[Path] = None
-    dot_path: List[str] = field(default_factory=list)  # ["animal", "feline", "cat"] means: import animal.feline.cat
+# Types:
+Instruction = Tuple[Optional[int], int, str, int, str]  # line number, offset, op-code, operand, and note
+Instructions = Tuple[Instruction, ...]
+CodeKey = Tuple[Any, str, bytes]  # see code_key()
 
-    def __post_init__(self):
-        self.name_dict["__name__"] = self.name
-        self.name_dict.update(BUILT_INS)
+# Constants:
+LOG = logging.getLogger(__name__)
+JUMP_OP_CODES = frozenset(hasjabs + hasjrel)
+
+# Globals: the least recently used are forgotten, though functions keep the blocks they were made from
+CODE_BLOCKS: Dict[CodeKey, CodeBlock] = LRUDict(CONSTANTS.CODE_CACHE.MAX_CODE_BLOCKS)  # see decode()
+DECODED: Dict[CodeKey, Instructions] = LRUDict(  # instructions from the code cache that decode() hasn't needed yet
+    CONSTANTS.CODE_CACHE.MAX_CODE_BLOCKS)
+
+
+def decode_instructions(code: CODE_CLASS) -> Instructions:  # type: ignore[valid-type]
+    """
+    Decode the byte code into a dense table of instructions. Jump targets are byte offsets, so they are rewritten to
+    indexes into that table; relative or absolute, every jump then simply sets the program counter.
+    """
+    instructions = list(get_instructions(code))
+    index_of = {instr.offset: index for index, instr in enumerate(instructions)}
+    return tuple((instr.starts_line, instr.offset, instr.opname,
+                  index_of[instr.argval] if instr.opcode in JUMP_OP_CODES else instr.arg or 0, instr.argrepr)
+                 for instr in instructions)
+
+
+class Module(VersionedNames):
+    def __init__(self, name: str, name_dict: Optional[Dict[str, Any]] = None, path: Optional[Path] = None,
+                 dot_path: Optional[List[str]] = None):
+        super().__init__({} if name_dict is None else name_dict)
+        self.name = name
+        self.path = path
+        self.dot_path = [] if dot_path is None else dot_path  # ["animal", "feline", "cat"]: import animal.feline.cat
+        self.name_dict["__name__"] = name
 
     def __repr__(self):
         return f"Module({self.name}, {len(self.name_dict)} names)"
 
+    def get_name(self, name: str):
+        # Built-ins sit behind the module's own names rather than being copied into every module
+        try:
+            return self.name_dict[name]
+        except KeyError:
+            return BUILT_INS[name]
+
     def get_method(self, name: str):
         return self.get_name(name)
 
@@ -48,38 +80,123 @@ class Module(GetName, Function):
 
     def read_source_file(self, path: Path) -> Function:
         with path.open("rt") as file_obj:
-            return self.add_source_code(file_obj.read())
+            source_code = file_obj.read()
+        from robot_war.vm.code_cache import CODE_CACHE
+        code, decoded = CODE_CACHE.compile(source_code, str(path))
+        for nested, instructions in decoded.items():
+            key = code_key(nested)
+            if key not in CODE_BLOCKS:
+                DECODED[key] = instructions
+        return self.add_code(code)
 
     def add_code(self, code: CODE_CLASS) -> Function:  # type: ignore[valid-type]
-        from robot_war.vm.instructions.op_code_dict import OP_CODE_CLASSES
-
-        # Code block
-        code_block = CodeBlock(module=self)
-        for instr in get_instructions(code):
-            line_class = OP_CODE_CLASSES[instr.opname]
-            instr_obj = line_class(instr.starts_line, instr.offset, instr.opname, instr.arg or 0, instr.argrepr)
-            code_block.code_lines[instr.offset] = instr_obj
-        self.set_name(str(code), code_block)  # save code block
-
-        # Number of arguments
-        info_str = code_info(code)
-        match = SEARCH_NUM_ARGS.search(info_str)
-        assert match
-        code_block.num_params = int(match.group(1))
-
-        # Argument names
-        match = SEARCH_VAR_NAMES1.search(info_str)
-        if match:
-            var_name_str = match.group(1)
-            match = SEARCH_VAR_NAMES2.search(var_name_str)
-            if match:
-                var_name_str = match.group(1)
-            var_name_dict = {int(index): name for index, name in SEARCH_VAR_NAMES3.findall(var_name_str)}
-            code_block.param_names = [var_name_dict[index] for index in range(code_block.num_params)]
-
-        # Grab other code blocks
-        for constant in code.co_consts:  # type: ignore[attr-defined]
-            if isinstance(constant, CODE_CLASS):
-                self.add_code(constant)
-
-        return Function(code.co_name, code_block.param_names, code_block)  # type: ignore[attr-defined]
+        return Function(code.co_name, decode(code), self)  # type: ignore[attr-defined]
+
+
+class LazyModule(Module):
+    """
+    A module imported lazily (see CONSTANTS.IMPORTS.LAZY): a stand-in whose code only runs the first time an instruction
+    looks in it, or getattr() or hasattr() does. The instructions that look in modules check for us and hand over to
+    load() instead; getattr() and hasattr() hand over to load_and_call().
+    """
+    def load(self, sandbox: "SandBox") -> Signal:
+        """
+        Run our code, then push us, now an ordinary module, and have the instruction that looked in us run again. The
+        instruction must already have popped us, and anything else it popped must be back on the stack.
+        """
+        code = self.become_module()
+        sandbox.context.pc -= 1
+        from robot_war.vm.source_functions import trampoline
+        return sandbox.call_function(trampoline("__lazy_load__", LazyModule.build_load), code, self)
+
+    def load_and_call(self, sandbox: "SandBox", function: Callable, name: str) -> Signal:
+        """For a native function that looks in us: run our code, then return function(us, name) as the native's value"""
+        code = self.become_module()
+        from robot_war.vm.source_functions import trampoline
+        return sandbox.call_function(trampoline("__lazy_call__", LazyModule.build_call), code, self, function, name)
+
+    def become_module(self) -> Function:
+        """
+        Read and compile our code, then become an ordinary module, even as our code runs. If our source can't be read
+        or compiled, we stay lazy, so that the next look in us raises the same error again.
+        """
+        if self.path is None:
+            raise ImportError(f"Unable to import {self.name}: it has no file")
+        code = self.read_source_file(self.path)
+        self.__class__ = Module  # type: ignore[assignment]
+        return code
+
+    @staticmethod
+    def build_load() -> FunctionCreator:
+        """Build a function that calls a module's code and then returns the module"""
+        with FunctionCreator("__lazy_load__", ["code", "module"]) as load:
+            load.LOAD_FAST("code")
+            load.CALL_FUNCTION(0)
+            load.POP_TOP()  # Discard the None the module's code returns
+            load.LOAD_FAST("module")
+            load.RETURN_VALUE()
+        return load
+
+    @staticmethod
+    def build_call() -> FunctionCreator:
+        """Build a function that calls a module's code and then returns function(module, name)"""
+        with FunctionCreator("__lazy_call__", ["code", "module", "function", "name"]) as call:
+            call.LOAD_FAST("code")
+            call.CALL_FUNCTION(0)
+            call.POP_TOP()  # Discard the None the module's code returns
+            call.LOAD_FAST("function")
+            call.LOAD_FAST("module")
+            call.LOAD_FAST("name")
+            call.CALL_FUNCTION(2)
+            call.RETURN_VALUE()
+        return call
+
+
+def code_key(code: CODE_CLASS) -> CodeKey:  # type: ignore[valid-type]
+    """
+    Equal code objects share a code block, as long as their file names and line numbers match too: code objects compare
+    equal without them, but tracebacks and the profiler need the block to know where its code came from
+    """
+    return code, code.co_filename, code.co_lnotab  # type: ignore[attr-defined]
+
+
+def decode(code: CODE_CLASS) -> CodeBlock:  # type: ignore[valid-type]
+    """
+    Returns the code block for a code object, decoding it the first time we're asked. Code nested in it (functions,
+    class bodies, comprehensions) stays a code object until MAKE_FUNCTION first reaches it, so code that never runs is
+    never decoded. A block is only shared once it's complete: code we can't decode raises the same error every time
+    we're asked.
+
+    Every module, in every Playground, that runs the same code shares its block, and with it the inline caches its
+    instructions keep. Those are safe to share, as each checks it still applies before it's used, but not free.
+    Namespace versions are unique across the process, so robots running the same script in different Playgrounds keep
+    replacing each other's LOAD_GLOBAL and LOAD_NAME entries. And the value in such an entry stays alive until the
+    instruction caches another, even after the Playground it came from is gone.
+    """
+    key = code_key(code)
+    code_block = CODE_BLOCKS.get(key)
+    if code_block is not None:
+        return code_block
+    from robot_war.vm.instructions.op_code_dict import OP_CODE_CLASSES
+
+    # Constants are taken straight from the code object
+    code_block = CodeBlock(file_name=code.co_filename)  # type: ignore[attr-defined]
+    constants = code.co_consts  # type: ignore[attr-defined]
+    instructions = DECODED.get(key) or decode_instructions(code)
+    for line_number, offset, op_code, operand, note in instructions:
+        value = constants[operand] if op_code == "LOAD_CONST" else None
+        code_block.code_lines.append(OP_CODE_CLASSES[op_code](line_number, offset, op_code, operand, note, value))
+    code_block.build_dispatch()
+
+    # Parameters and other local variables
+    var_names = code.co_varnames  # type: ignore[attr-defined]
+    code_block.num_params = code.co_argcount  # type: ignore[attr-defined]
+    code_block.param_names = list(var_names[:code_block.num_params])
+    code_block.num_locals = code.co_nlocals  # type: ignore[attr-defined]
+    code_block.num_cells = len(code.co_cellvars)  # type: ignore[attr-defined]
+    code_block.cell_params = {index: var_names.index(name)
+                              for index, name in enumerate(code.co_cellvars)  # type: ignore[attr-defined]
+                              if name in var_names}
+    CODE_BLOCKS[key] = code_block
+    DECODED.pop(key, None)
+    return code_block
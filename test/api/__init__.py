@@ -16,7 +16,7 @@ def run_in_vm(function1, functions: Optional[List[Callable]] = None):
     module = Module("module", name_dict=dict(BUILT_INS))
     playground = Playground(Path("."))
     sandbox = SandBox(playground)
-    playground.sandboxes = [sandbox]
+    playground.scheduler.wake(sandbox)
     if functions is None:
         functions = []
 
@@ -28,7 +28,7 @@ def run_in_vm(function1, functions: Optional[List[Callable]] = None):
         sandbox.call_function(module.get_name(function1.__name__))
 
         # while not sandbox.done:
-        while playground.sandboxes or playground.workers:
+        while playground.scheduler.busy:
             playground.step_all()
 
     if isinstance(function1, list):
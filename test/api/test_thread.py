@@ -49,6 +49,38 @@ def test_thread_subclass():
     MyThread().run()
 
 
+@run_in_vm
+def test_thread_arguments():
+    from thread import Thread
+
+    def func(a, b, c=0, d=0):
+        return a * 1000 + b * 100 + c * 10 + d
+
+    threads = [Thread().start(func, index, 2, d=4) for index in range(3)]
+    threads.append(Thread().start(func, 5, 6, c=7, d=8))
+    assert [thread.join() for thread in threads] == [204, 1204, 2204, 5678]
+
+
+@run_in_vm
+def test_thread_priority():
+    from thread import Thread
+
+    log = []
+
+    def count(name):
+        total = 0
+        for i in range(500):
+            total += i
+        log.append(name)
+        return total
+
+    slow = Thread().start(count, "slow")
+    fast = Thread().set_priority(5).start(count, "fast")
+    assert slow.join() == 124750
+    assert fast.join() == 124750
+    assert log == ["fast", "slow"]
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
     test_thread_subclass()
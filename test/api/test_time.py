@@ -17,6 +17,24 @@ def test_time():
     assert t2 > t1
 
 
+@run_in_vm
+def test_sleep_order():
+    from time import sleep
+    from thread import Thread
+
+    woken = []
+
+    def wait(delay):
+        assert sleep(delay) is None
+        woken.append(delay)
+
+    for delay in [0.03, 0.01, 0.02, 0.0]:
+        Thread().start(wait, delay)
+    sleep(0.05)
+    assert woken == [0.0, 0.01, 0.02, 0.03]
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
     test_time()
+    test_sleep_order()
@@ -1,3 +1,7 @@
+import pytest
+
+from robot_war.vm.code_cache import CODE_CACHE
+
 # Globals:
 G_CALLED_FROM_TEST = False
 
@@ -5,3 +9,9 @@ G_CALLED_FROM_TEST = False
 def pytest_configure(config):
     global G_CALLED_FROM_TEST
     G_CALLED_FROM_TEST = True
+
+
+@pytest.fixture(autouse=True)
+def code_cache_directory(tmp_path, monkeypatch):
+    """Scripts compiled by tests are cached under tmp_path, not in the user's code cache"""
+    monkeypatch.setattr(CODE_CACHE, "directory", tmp_path / "code_cache")
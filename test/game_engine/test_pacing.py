@@ -0,0 +1,49 @@
+import logging
+
+from robot_war.game_engine.pacing import FramePacer
+
+# Constants:
+LOG = logging.getLogger(__name__)
+
+
+def run_frame(pacer: FramePacer, now: float, paint_time: float, vm_time: float) -> float:
+    """Run a frame starting at now, taking the given times, and return when the next one starts"""
+    if pacer.start_frame(now):
+        pacer.rendered(paint_time, 0.0)
+        now += paint_time
+    now += min(vm_time, pacer.vm_budget())
+    pacer.stepped(vm_time)
+    return now + pacer.end_frame(now)
+
+
+def test_vm_gets_what_rendering_leaves():
+    pacer = FramePacer(frame_time=0.1, smoothing=1.0, min_vm_time=0.01)
+    now = run_frame(pacer, 0.0, 0.03, 0.01)
+    assert abs(now - 0.1) < 1e-9
+    assert pacer.rendering and abs(pacer.vm_budget() - 0.07) < 1e-9
+    pacer.rendered(0.5, 0.0)
+    assert pacer.vm_budget() == 0.01
+
+
+def test_skip_rendering_when_behind():
+    pacer = FramePacer(frame_time=0.1, max_skipped=2, smoothing=1.0, min_vm_time=0.01)
+    rendered = []
+    now = 0.0
+    for _ in range(5):
+        now = run_frame(pacer, now, 0.25, 0.05)  # rendering alone takes longer than a frame
+        rendered.append(pacer.rendering)
+    assert rendered == [True, False, False, True, False]
+    assert pacer.metrics()["frames_skipped"] == 3
+
+    # Catch up once rendering is quick again
+    for _ in range(10):
+        now = run_frame(pacer, now, 0.01, 0.05)
+    assert pacer.rendering and pacer.lag == 0.0
+
+
+def test_drop_time_too_far_behind():
+    pacer = FramePacer(frame_time=0.1, max_skipped=2, smoothing=1.0)
+    pacer.start_frame(0.0)
+    assert pacer.end_frame(5.0) == 0.0
+    assert pacer.time_dropped > 4.0
+    assert pacer.start_frame(5.0)
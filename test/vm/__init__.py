@@ -9,7 +9,6 @@ import sys
 from typing import Optional, List, Callable, Dict, Any
 
 from robot_war.constants import CONSTANTS
-from robot_war.exceptions import ReturnException
 from robot_war.vm.built_ins import BUILT_INS
 from robot_war.vm.exec_context import SandBox, Playground
 from robot_war.vm.source_functions import Function
@@ -79,11 +78,7 @@ def run_in_vm(function1, functions: Optional[List[Callable]] = None):
         sandbox.call_function(constructor)
         sandbox.exec_through()
         sandbox.call_function(module.get_name(function1.__name__))
-
-        try:
-            sandbox.exec_through()
-        except ReturnException as ret:
-            return ret.value
+        return sandbox.exec_through()
 
     if isinstance(function1, list):
         return lambda function3: run_in_vm(function3, function1)
@@ -108,13 +103,10 @@ def compare_external(base_module: str, args: List[str]):
     module = Module("__main__", name_dict=dict(BUILT_INS), path=base_path)
     playground.all_modules = {"__main__": module, "sys": sys_mod}
     sandbox = SandBox(playground)
-    playground.sandboxes = [sandbox]
+    playground.scheduler.wake(sandbox)
     sandbox.call_function(module.read_source_file(base_path))
-    try:
-        with capture_stdout() as vm_io:
-            sandbox.exec_through()
-    except ReturnException:
-        pass
+    with capture_stdout() as vm_io:
+        sandbox.exec_through()
     standard_io = check_output([sys.executable, base_path] + args, text=True)
     assert standard_io == vm_io.getvalue()
     if not conftest.G_CALLED_FROM_TEST:
@@ -0,0 +1,126 @@
+"""
+Interpreter benchmarks. These aren't tests, so pytest doesn't collect them. Run them with:
+
+    python -m test.vm.benchmark [--save FILE] [--compare FILE] [name ...]
+
+To measure a change, save the times from a checkout without it, then compare a checkout with it against them.
+"""
+
+from argparse import ArgumentParser
+from inspect import getsource
+import json
+import logging
+from pathlib import Path
+import sys
+from time import perf_counter
+from typing import Callable, Dict, List
+
+from robot_war.vm.built_ins import BUILT_INS
+from robot_war.vm.exec_context import SandBox, Playground
+from robot_war.vm.source_module import Module
+
+# Constants:
+LOG = logging.getLogger(__name__)
+REPEAT = 5
+
+
+def add(a, b):
+    return a + b
+
+
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+
+class Vector:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def dot(self, other):
+        return self.x * other.x + self.y * other.y
+
+
+def calls():
+    total = 0
+    for i in range(20000):
+        total = add(total, i)
+    return total
+
+
+def recursion():
+    return fib(18)
+
+
+def loops():
+    total = 0
+    for i in range(50000):
+        if i < 25000:
+            total += i
+    return total
+
+
+def objects():
+    total = 0
+    for i in range(5000):
+        vector = Vector(i, 2)
+        total += vector.dot(vector)
+    return total
+
+
+def sleeps():
+    from time import sleep
+
+    for _ in range(5000):
+        sleep(0)
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    "calls": calls, "recursion": recursion, "loops": loops, "objects": objects, "sleeps": sleeps}
+
+
+def time_benchmark(benchmark: Callable) -> float:
+    """Returns the best time, in seconds, to run benchmark to completion in a Playground"""
+    module = Module("benchmark", name_dict=dict(BUILT_INS))
+    playground = Playground(Path("."))
+    sandbox = SandBox(playground)
+    sandbox.call_function(module.add_source_code("\n".join(
+        getsource(function) for function in [add, fib, Vector, benchmark])))
+    sandbox.exec_through()
+
+    best = float("inf")
+    for _ in range(REPEAT):
+        sandbox = SandBox(playground)
+        playground.scheduler.wake(sandbox)
+        sandbox.call_function(module.get_name(benchmark.__name__))
+        start = perf_counter()
+        while playground.scheduler.busy:
+            playground.step_all()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main(args: List[str]):
+    parser = ArgumentParser(prog="python -m test.vm.benchmark")
+    parser.add_argument("--save", type=Path, help="write the times to this file, as JSON")
+    parser.add_argument("--compare", type=Path, help="compare the times with those saved in this file")
+    parser.add_argument("names", nargs="*", help=f"the benchmarks to run, of {', '.join(BENCHMARKS)}: all of them")
+    options = parser.parse_args(args)
+    unknown = [name for name in options.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    before: Dict[str, float] = json.loads(options.compare.read_text()) if options.compare else {}
+    times = {}
+    for name in options.names or BENCHMARKS:
+        times[name] = time_benchmark(BENCHMARKS[name])
+        line = f"{name:12} {times[name] * 1000.0:8.1f} ms"
+        if name in before:
+            line += f" {before[name] * 1000.0:8.1f} ms before, {before[name] / times[name]:5.2f}x"
+        print(line)
+    if options.save:
+        options.save.write_text(json.dumps(times, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
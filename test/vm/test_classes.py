@@ -83,6 +83,86 @@ def test_hasattr():
     print(hasattr(obj, "f"))
 
 
+class Top:
+    name = "top"
+
+    def who(self):
+        return self.name
+
+
+class Left(Top):
+    pass
+
+
+class Right(Top):
+    name = "right"
+
+
+class Diamond(Left, Right):
+    pass
+
+
+@compare_in_vm([Top, Left, Right, Diamond])
+def test_method_resolution_order():
+    obj = Diamond()
+    print(obj.who())
+    print(isinstance(obj, Top), isinstance(obj, Right), isinstance(Left(), Right))
+    Right.name = "changed"
+    print(obj.who())
+    Right.name = "right"
+    print(obj.who())
+
+
+class Point:
+    kind = "point"
+
+    def __init__(self, x, y, swap):
+        if swap:
+            self.y = y
+            self.x = x
+        else:
+            self.x = x
+            self.y = y
+
+    def total(self):
+        return self.x + self.y
+
+
+@compare_in_vm([Point])
+def test_instance_attributes():
+    """LOAD_ATTR and STORE_ATTR on instances whose attributes were added in different orders"""
+    points = [Point(index, 10 * index, index % 2) for index in range(4)]
+    for point in points:
+        point.x = point.x + 1
+        print(point.x, point.y, point.total(), point.kind)
+    points[0].kind = "moved"
+    print(points[0].kind, points[1].kind)
+
+
+@compare_in_vm([Point, Base1])
+def test_constructors():
+    """Calling classes with and without __init__, and with keyword arguments"""
+    point = Point(swap=True, y=2, x=1)
+    print(point.x, point.y, Base1().b())
+    return point.total()
+
+
+def double(value):
+    return 2 * value
+
+
+@compare_in_vm([Point, double])
+def test_methods():
+    """LOAD_METHOD on methods, bound methods, and functions stored in instances"""
+    point = Point(1, 2, False)
+    total = point.total
+    print(total(), point.total())
+    point.callback = double
+    print(point.callback(5))
+    point.x = 10
+    print(total())
+
+
 # TODO:  super
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+import logging
+
+from robot_war.constants import CONSTANTS
+from robot_war.vm.code_cache import CodeCache, SUFFIX, find_scripts
+from robot_war.vm.lru_dict import LRUDict
+
+# Constants:
+LOG = logging.getLogger(__name__)
+SOURCE = "def func(a):\n    return [a * 2 for _ in range(a)]\n"
+
+
+def test_code_cache(tmp_path):
+    cache = CodeCache(tmp_path, 1024 * 1024)
+    code, decoded = cache.compile(SOURCE, "script.py")
+    assert [nested.co_name for nested in decoded] == ["<module>", "func", "<listcomp>"]
+    entries = list(tmp_path.glob(f"*{SUFFIX}"))
+    assert len(entries) == 1
+
+    # The next time, we have it already; in another process, we load what we saved
+    assert cache.compile(SOURCE, "script.py")[0] is code
+    cached_code, cached_decoded = CodeCache(tmp_path, 1024 * 1024).compile(SOURCE, "script.py")
+    assert cached_code == code
+    assert list(cached_decoded.values()) == list(decoded.values())
+    assert list(tmp_path.glob(f"*{SUFFIX}")) == entries
+
+    # Different source or a different file name is a different entry
+    cache.compile(SOURCE + "\n", "script.py")
+    cache.compile(SOURCE, "other.py")
+    assert len(list(tmp_path.glob(f"*{SUFFIX}"))) == 3
+
+
+def test_code_cache_in_memory_limit(tmp_path):
+    cache = CodeCache(tmp_path, 1024 * 1024, LRUDict(2))
+    first = cache.compile(SOURCE, "first.py")
+    cache.compile(SOURCE, "second.py")
+    assert cache.compile(SOURCE, "first.py") is first  # now the most recently used
+    cache.compile(SOURCE, "third.py")
+    assert len(cache.loaded) == 2
+    assert cache.entry_name(SOURCE, "second.py") not in cache.loaded
+    assert cache.entry_name(SOURCE, "first.py") in cache.loaded
+
+
+def test_code_cache_corrupt(tmp_path):
+    cache = CodeCache(tmp_path, 1024 * 1024)
+    code, decoded = cache.compile(SOURCE, "script.py")
+    entry, = tmp_path.glob(f"*{SUFFIX}")
+    entry.write_bytes(b"garbage")
+    recompiled, redecoded = CodeCache(tmp_path, 1024 * 1024).compile(SOURCE, "script.py")
+    assert recompiled == code and list(redecoded) == list(decoded)
+    assert entry.read_bytes() != b"garbage"
+
+
+def test_code_cache_eviction(tmp_path):
+    cache = CodeCache(tmp_path, 0)
+    cache.compile(SOURCE, "script.py")
+    assert not list(tmp_path.glob(f"*{SUFFIX}"))
+
+    cache.max_bytes = 1024 * 1024
+    for index in range(3):
+        cache.compile(SOURCE, f"script{index}.py")
+    sizes = [entry.stat().st_size for entry in tmp_path.glob(f"*{SUFFIX}")]
+    assert len(sizes) == 3
+    cache.max_bytes = sum(sizes) - 1
+    cache.evict()
+    assert len(list(tmp_path.glob(f"*{SUFFIX}"))) == 2
+
+
+def test_code_cache_preload(tmp_path):
+    externals = CONSTANTS.PATHS.TEST.EXTERNALS
+    scripts = list(find_scripts(externals))
+    assert externals / "sub1" / "sub2" / "ext2a.py" in scripts
+
+    cache = CodeCache(tmp_path, 1024 * 1024)
+    assert cache.preload(scripts, max_workers=2) == len(scripts)
+    assert len(list(tmp_path.glob(f"*{SUFFIX}"))) == len(scripts)
+    path = externals / "ext0.py"
+    code, _ = cache.compile(path.read_text(), str(path))
+    assert cache.compile(path.read_text(), str(path))[0] is code
+
+    # Another process finds them all on disk
+    assert CodeCache(tmp_path, 1024 * 1024).preload(scripts) == 0
@@ -106,6 +106,24 @@ def test_build_map():
     print(a)
 
 
+def set_global(value):
+    global G_GLOBAL
+
+    G_GLOBAL = value
+
+
+@compare_in_vm([set_global])
+def test_global_changes():
+    """LOAD_GLOBAL caches values, but must see each change"""
+    values = []
+    for index in range(3):
+        set_global(index)
+        values.append(G_GLOBAL)
+    values.append(str(5))
+    set_global(20)
+    return values
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
     test_set()
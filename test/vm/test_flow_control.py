@@ -1,6 +1,11 @@
 import logging
+from pathlib import Path
 from unittest import TestCase
 
+from robot_war.vm.built_ins import BUILT_INS
+from robot_war.vm.exec_context import Playground, SandBox
+from robot_war.vm.instructions.superinstructions import Superinstruction
+from robot_war.vm.source_module import CODE_BLOCKS, Module, code_key
 from test.vm import compare_in_vm, run_in_vm, dump_func
 
 # Constants:
@@ -69,6 +74,206 @@ def test_nested_loops():
                 print(i, j, k)
 
 
+def countdown(n):
+    total = n
+    if n:
+        total += countdown(n - 1)
+    return total
+
+
+@compare_in_vm([countdown])
+def test_recursion():
+    """Frames are recycled, so each call must start with its own locals"""
+    return countdown(10) + countdown(5)
+
+
+@compare_in_vm
+def test_unbound_local():
+    a = 1
+    del a
+    try:
+        print(a)
+    except UnboundLocalError:
+        print("unbound")
+
+
+def outer(a):
+    b = a + 1
+
+    def middle():
+        c = b * 2
+
+        def inner():
+            return a + b + c
+
+        return inner()
+
+    return middle()
+
+
+@compare_in_vm([outer])
+def test_cell_and_free_vars():
+    return outer(1)
+
+
+def zero():
+    return 0
+
+
+@compare_in_vm([zero, MyClass])
+def test_superinstructions():
+    """LOAD_FAST+LOAD_CONST+COMPARE_OP+POP_JUMP_IF_FALSE, LOAD_FAST+LOAD_FAST, LOAD_GLOBAL+CALL_FUNCTION, and
+    LOAD_METHOD+CALL_METHOD"""
+    i = zero()
+    obj = MyClass()
+    total = 0
+    while i < 5:
+        total = total + obj.b(i)
+        i = i + 1
+    text = "a b"
+    return total, i, text.split()
+
+
+FUSION_SOURCE = """
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def add(self, value):
+        self.count = self.count + value
+        return self.count
+
+def main(n):
+    counter = Counter()
+    results = []
+    i = 0
+    while i < n:
+        results.append(counter.add(i))
+        i = i + 1
+    try:
+        last = results[n]
+    except IndexError:
+        last = "IndexError"
+    return results, i, last
+"""
+
+
+def test_fused_and_unfused_dispatch():
+    """Superinstructions are only an optimization: the same code gives the same results without them"""
+    module = Module("module", name_dict=dict(BUILT_INS))
+    sandbox = SandBox(None)  # noqa
+    sandbox.call_function(module.add_code(compile(FUSION_SOURCE, "fusion.py", "exec")))
+    sandbox.exec_through()
+    counter_class = module.get_name("Counter")
+    code_blocks = [module.get_name("main").code_block] + [
+        counter_class.get_name(name).code_block for name in ["__init__", "add"]]
+    results = []
+    for fuse in [True, False]:
+        for code_block in code_blocks:
+            code_block.build_dispatch(fuse)
+        fused = [handler for code_block in code_blocks for handler in code_block.handlers
+                 if isinstance(handler.__self__, Superinstruction)]
+        assert bool(fused) == fuse
+        sandbox = SandBox(None)  # noqa
+        sandbox.call_function(module.get_name("main"), 6)
+        results.append(sandbox.exec_through())
+    assert results[0] == results[1] == ([0, 1, 3, 6, 10, 15], 6, "IndexError")
+
+
+def bind(a, b, c=3, d=4):
+    e = a + b
+    return e, c, d
+
+
+@compare_in_vm([bind])
+def test_argument_binding():
+    return bind(1, 2), bind(1, 2, 5), bind(1, 2, 5, 6), bind(1, b=2, d=7), bind(d=1, c=2, b=3, a=4)
+
+
+class Box:
+    def __init__(self, value):
+        self.value = value
+
+
+def one(a):
+    return a + 1
+
+
+@compare_in_vm([one, Box, MyClass])
+def test_call_site_types():
+    """One call site calling a source function, a class, a bound method, native functions, and a native class"""
+    obj = MyClass()
+    results = []
+    for callee in [one, Box, obj.b, int, str, print, one, Box, obj.b, int]:
+        result = callee(-2)
+        results.append(result.value if hasattr(result, "value") else result)
+    return results
+
+
+def test_lazy_decoding():
+    """Nested code is only decoded once MAKE_FUNCTION reaches it"""
+    module = Module("module", name_dict=dict(BUILT_INS))
+    sandbox = SandBox(None)  # noqa
+    code = compile("def outer():\n    def inner():\n        return 'lazy'\n    return inner()\n", "lazy.py", "exec")
+    outer_code = code.co_consts[0]
+    inner_code = outer_code.co_consts[1]
+    sandbox.call_function(module.add_code(code))
+    sandbox.exec_through()
+    assert code_key(outer_code) in CODE_BLOCKS and code_key(inner_code) not in CODE_BLOCKS
+    sandbox.call_function(module.get_name("outer"))
+    assert sandbox.exec_through() == "lazy"
+    assert code_key(inner_code) in CODE_BLOCKS
+
+
+def test_failed_decode():
+    """Code we can't decode isn't cached half built: it fails the same way every time"""
+    code = compile("a, b = 1, 2\n", "unpack.py", "exec")  # UNPACK_SEQUENCE isn't supported
+    for _ in range(2):
+        with TestCase().assertRaises(KeyError):
+            Module("module", name_dict=dict(BUILT_INS)).add_code(code)
+        assert code_key(code) not in CODE_BLOCKS
+
+
+def test_failed_nested_decode():
+    """Nested code we can't decode fails at each def, the same way, rather than making a broken function"""
+    module = Module("module", name_dict=dict(BUILT_INS))
+    sandbox = SandBox(None)  # noqa
+    code = compile("def outer():\n    def inner():\n        a, b = 1, 2\n    return inner\n", "nested.py", "exec")
+    sandbox.call_function(module.add_code(code))
+    sandbox.exec_through()
+    for _ in range(2):
+        sandbox.call_function(module.get_name("outer"))
+        with TestCase().assertRaises(KeyError):
+            sandbox.exec_through()
+
+
+def run_ticks(ticks: int, fuel_per_tick: int, source_code: str = "while True:\n    count += 1\n") -> int:
+    module = Module("module", name_dict=dict(BUILT_INS, count=0))
+    playground = Playground(Path("."), fuel_per_tick=fuel_per_tick)
+    sandbox = SandBox(playground)
+    playground.scheduler.wake(sandbox)
+    sandbox.call_function(module.add_source_code(source_code))
+    for _ in range(ticks):
+        playground.step_all()
+        assert playground.fuel <= 0 or not playground.scheduler.ready
+    return module.get_name("count")
+
+
+def test_fuel_per_tick():
+    """A robot gets the same amount done every tick, however fast the host is"""
+    one_tick = run_ticks(1, 500)
+    assert 0 < one_tick < 500
+    assert run_ticks(1, 500) == one_tick
+    assert run_ticks(4, 500) == 4 * one_tick
+    assert run_ticks(1, 1000) == 2 * one_tick
+
+
+def test_sleep_in_ticks():
+    """Sleeps are measured in ticks of game time, not by the host's clock"""
+    source_code = "from time import sleep\nwhile True:\n    sleep(0.09)\n    count += 1\n"
+    assert run_ticks(10, 500, source_code) == 3  # each sleep is 3 ticks of 1/30 s
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
     test_for_loops()
@@ -1,7 +1,12 @@
 import logging
+from typing import List
 
+from robot_war.api.time import TIME_MODULE
 from robot_war.constants import CONSTANTS
-from test.vm import compare_external
+from robot_war.vm.built_ins import BUILT_INS
+from robot_war.vm.exec_context import Playground, SandBox
+from robot_war.vm.source_module import LazyModule, Module
+from test.vm import capture_stdout, compare_external
 
 # Constants:
 LOG = logging.getLogger(__name__)
@@ -89,3 +94,103 @@ def test_import_t():
 
 def test_import_u():
     compare_external("ext0", ["ext2e", "func2f"])
+
+
+def test_playgrounds_share_code_not_names():
+    functions = []
+    for marker in [1, 2]:
+        playground = Playground(CONSTANTS.PATHS.TEST.EXTERNALS)
+        module = Module("__main__", name_dict=dict(BUILT_INS, marker=marker),
+                        path=CONSTANTS.PATHS.TEST.EXTERNALS / "main.py")
+        sandbox = SandBox(playground)
+        function = module.add_source_code("import time\ntime.marker = marker\n")
+        sandbox.call_function(function)
+        sandbox.exec_through()
+        assert playground.api_modules["time"].get_name("marker") == marker
+        functions.append(function)
+    assert functions[0].code_block is functions[1].code_block
+    assert "marker" not in TIME_MODULE.name_dict
+
+
+def test_same_code_in_different_files():
+    module = Module("module", name_dict=dict(BUILT_INS))
+    blocks = [module.add_code(compile("def same():\n    return 1\n", file_name, "exec")).code_block
+              for file_name in ["robot1.py", "robot2.py"]]
+    assert [block.file_name for block in blocks] == ["robot1.py", "robot2.py"]
+
+
+def test_read_source_file_name(tmp_path):
+    """A script's code is named for the file it was read from, whether or not its module has a path"""
+    script_path = tmp_path / "script.py"
+    script_path.write_text("def func():\n    return 1\n")
+    function = Module("module", name_dict=dict(BUILT_INS)).read_source_file(script_path)
+    assert function.code_block.file_name == str(script_path)
+
+
+def run_lazy_imports(tmp_path, lazy: bool) -> List[str]:
+    (tmp_path / "helper.py").write_text("print('helper running')\nvalue = 1\n\ndef double():\n    return value * 2\n")
+    (tmp_path / "pkg").mkdir(exist_ok=True)
+    (tmp_path / "pkg" / "__init__.py").write_text("print('pkg running')\n")
+    (tmp_path / "pkg" / "sub.py").write_text("print('sub running')\nthing = 'thing'\n")
+    main_path = tmp_path / "main.py"
+    main_path.write_text("import helper\nimport pkg.sub\nprint('main running')\nprint(helper.value)\n"
+                         "from pkg.sub import thing\nprint(thing)\nhelper.value = 3\nprint(helper.double())\n")
+    playground = Playground(tmp_path, lazy_imports=lazy)
+    module = Module("__main__", name_dict=dict(BUILT_INS), path=main_path)
+    playground.all_modules = {"__main__": module}
+    sandbox = SandBox(playground)
+    sandbox.call_function(module.read_source_file(main_path))
+    with capture_stdout() as vm_io:
+        sandbox.exec_through()
+    return vm_io.getvalue().split()
+
+
+def test_lazy_imports(tmp_path):
+    assert run_lazy_imports(tmp_path, False) == [
+        "helper", "running", "pkg", "running", "sub", "running", "main", "running", "1", "thing", "6"]
+    assert run_lazy_imports(tmp_path, True) == [
+        "main", "running", "helper", "running", "1", "sub", "running", "thing", "6"]
+
+
+def test_lazy_import_error(tmp_path):
+    """A lazy module that doesn't compile raises the same error each time something looks in it"""
+    (tmp_path / "broken.py").write_text("def broken(:\n")
+    main_path = tmp_path / "main.py"
+    main_path.write_text("import broken\nfor _ in range(2):\n    try:\n        broken.broken\n"
+                         "    except SyntaxError:\n        print('SyntaxError')\n")
+    playground = Playground(tmp_path, lazy_imports=True)
+    module = Module("__main__", name_dict=dict(BUILT_INS, SyntaxError=SyntaxError), path=main_path)
+    playground.all_modules = {"__main__": module}
+    sandbox = SandBox(playground)
+    sandbox.call_function(module.read_source_file(main_path))
+    with capture_stdout() as vm_io:
+        sandbox.exec_through()
+    assert vm_io.getvalue().split() == ["SyntaxError", "SyntaxError"]
+
+
+def test_lazy_getattr(tmp_path):
+    """getattr() and hasattr() load a lazy module as any other look in it does"""
+    for name in ["first", "second"]:
+        (tmp_path / f"{name}.py").write_text(f"print('{name} running')\nvalue = '{name}'\n")
+    main_path = tmp_path / "main.py"
+    main_path.write_text("import first\nimport second\nprint(getattr(first, 'value'))\n"
+                         "print(hasattr(second, 'value'))\nprint(hasattr(second, 'other'))\n")
+    playground = Playground(tmp_path, lazy_imports=True)
+    module = Module("__main__", name_dict=dict(BUILT_INS), path=main_path)
+    playground.all_modules = {"__main__": module}
+    sandbox = SandBox(playground)
+    sandbox.call_function(module.read_source_file(main_path))
+    with capture_stdout() as vm_io:
+        sandbox.exec_through()
+    assert vm_io.getvalue().split() == ["first", "running", "first", "second", "running", "True", "False"]
+
+
+def test_lazy_module_without_file():
+    """A lazy module with no file to read raises ImportError when something looks in it"""
+    module = Module("__main__", name_dict=dict(BUILT_INS, ImportError=ImportError, lazy=LazyModule("lazy")))
+    sandbox = SandBox(Playground(CONSTANTS.PATHS.TEST.EXTERNALS))
+    function = module.add_source_code("try:\n    lazy.value\nexcept ImportError:\n    print('ImportError')\n")
+    sandbox.call_function(function)
+    with capture_stdout() as vm_io:
+        sandbox.exec_through()
+    assert vm_io.getvalue().split() == ["ImportError"]
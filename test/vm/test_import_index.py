@@ -0,0 +1,31 @@
+import logging
+from time import sleep
+
+from robot_war.constants import CONSTANTS
+from robot_war.vm.import_index import ImportIndex, import_index
+
+# Constants:
+LOG = logging.getLogger(__name__)
+
+
+def test_import_index():
+    externals = CONSTANTS.PATHS.TEST.EXTERNALS
+    index = import_index(externals)
+    assert import_index(externals) is index
+    assert index.is_module(externals, "ext0")
+    assert index.is_package(externals, "sub1")
+    assert index.is_package(externals / "sub1", "sub2")
+    assert index.is_module(externals / "sub1" / "sub2", "ext2a")
+    assert not index.is_module(externals, "sub1")
+    assert not index.is_package(externals, "ext0")
+    assert not index.is_module(externals / "missing", "ext0")
+
+
+def test_import_index_refresh(tmp_path, monkeypatch):
+    monkeypatch.setattr(CONSTANTS.IMPORTS, "REFRESH_SECONDS", 0.0)
+    index = ImportIndex(tmp_path)
+    assert not index.is_package(tmp_path, "pkg")
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "__init__.py").write_text("")
+    sleep(0.01)  # make sure the modification time moves on
+    assert index.is_package(tmp_path, "pkg")
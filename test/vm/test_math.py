@@ -91,6 +91,17 @@ def test_not():
     return not a
 
 
+@compare_in_vm
+def test_inplace():
+    a = [1]
+    b = a
+    a += [2]
+    c = 7
+    c %= 4
+    c *= 3
+    return a, b, a is b, c
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
     test_not()
@@ -0,0 +1,74 @@
+import io
+import logging
+from pathlib import Path
+import pstats
+
+from robot_war.vm.built_ins import BUILT_INS
+from robot_war.vm.exec_context import Playground, SandBox
+from robot_war.vm.profiler import Profiler
+from robot_war.vm.source_module import CODE_BLOCKS, Module
+
+# Constants:
+LOG = logging.getLogger(__name__)
+SOURCE = """
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+def main():
+    return [fib(5), fib(3)]
+"""
+
+
+def run_profiled(profiler: Profiler) -> list:
+    module = Module("profiled", name_dict=dict(BUILT_INS))
+    sandbox = SandBox(Playground(Path(".")))
+    sandbox.call_function(module.add_code(compile(SOURCE, "profiled.py", "exec")))
+    sandbox.exec_through()
+    code_block = module.get_name("fib").code_block
+    with profiler:
+        assert all(handler.__name__ == "profiled" for handler in code_block.handlers)
+        sandbox.call_function(module.get_name("main"))
+        result = sandbox.exec_through()
+    assert all(handler.__name__ != "profiled" for handler in code_block.handlers), \
+        "disabling the profiler should unwrap"
+    return result
+
+
+def test_profiler(tmp_path):
+    profiler = Profiler()
+    assert run_profiled(profiler) == [5, 2]
+    path = tmp_path / "robot.prof"
+    profiler.dump_stats(path)
+
+    stats = pstats.Stats(str(path))
+    fib = ("profiled.py", 3, "fib")
+    main = ("profiled.py", 6, "main")
+    primitive_calls, calls, exclusive, inclusive, callers = stats.stats[fib]  # type: ignore[attr-defined]
+    assert (primitive_calls, calls) == (2, 15 + 5)
+    assert 0.0 < exclusive and inclusive <= stats.stats[main][3]  # type: ignore[attr-defined]
+    assert callers[main][:2] == (2, 2) and callers[fib][:2] == (0, 18)
+
+    output = io.StringIO()
+    profiler.print_op_codes(output)
+    assert "COMPARE_OP" in output.getvalue() and "RETURN_VALUE" in output.getvalue()
+
+
+def test_profiler_while_tracing(caplog):
+    """Tracing op-codes doesn't stop them being profiled"""
+    caplog.set_level(logging.DEBUG, logger="robot_war.vm.instructions")
+    profiler = Profiler()
+    assert run_profiled(profiler) == [5, 2]
+    assert profiler.functions[("profiled.py", 3, "fib")][:2] == [2, 15 + 5]
+
+
+def test_profiler_unwraps_forgotten_code():
+    """Disabling unwraps every code block it wrapped, even ones the code cache has since forgotten"""
+    module = Module("forgotten", name_dict=dict(BUILT_INS))
+    sandbox = SandBox(Playground(Path(".")))
+    sandbox.call_function(module.add_code(compile(SOURCE, "forgotten.py", "exec")))
+    sandbox.exec_through()
+    code_block = module.get_name("fib").code_block
+    with Profiler():
+        for key in [key for key, value in CODE_BLOCKS.items() if value is code_block]:
+            del CODE_BLOCKS[key]
+    assert all(handler.__name__ == "exec" for handler in code_block.handlers)
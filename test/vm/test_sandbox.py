@@ -0,0 +1,87 @@
+import logging
+from pathlib import Path
+
+from robot_war.signals import DONE, BlockFunction, BlockGenerator
+from robot_war.vm.api_class import Waiter, requires_sandbox
+from robot_war.vm.built_ins import BUILT_INS
+from robot_war.vm.exec_context import Playground, SandBox
+from robot_war.vm.source_module import Module
+
+# Constants:
+LOG = logging.getLogger(__name__)
+SOURCE = """
+def count(n):
+    total = 0
+    for i in range(n):
+        total += i
+    return total
+"""
+SIGNALS = """
+def double(a):
+    return a * 2
+
+result = [apply(double, 21), wait(), pause()]
+"""
+
+
+def test_run_budget():
+    """run() stops when its budget runs out, and carries on from there next time"""
+    module = Module("module", name_dict=dict(BUILT_INS))
+    sandbox = SandBox(None)  # noqa
+    sandbox.call_function(module.add_source_code(SOURCE))
+    sandbox.exec_through()
+    sandbox = SandBox(None)  # noqa
+    sandbox.call_function(module.get_name("count"), 100)
+
+    assert sandbox.run(0) is None and sandbox.context.pc == 0
+    assert sandbox.run(10) is None
+    assert not sandbox.done and sandbox.budget_left <= 0
+    runs = 1
+    signal = sandbox.run(10)
+    while signal is None:
+        assert not sandbox.done
+        runs += 1
+        signal = sandbox.run(10)
+    assert signal is DONE and sandbox.done
+    assert sandbox.return_value == sum(range(100))
+    assert runs > 10
+    assert 0 <= sandbox.budget_left < 10  # what the last run had left over
+
+
+def test_signals():
+    """Natives return signals rather than raising: FRAME_CHANGED to call into the VM, and blocks to wait"""
+    waiter = Waiter()
+
+    @requires_sandbox
+    def apply(function, value, sandbox):
+        return sandbox.call_function(function, value)  # FRAME_CHANGED: the function's frame returns our value
+
+    @requires_sandbox
+    def wait(sandbox):
+        return waiter.get_value(sandbox)
+
+    def pause():
+        def generator():
+            yield
+            return "paused"
+
+        return BlockGenerator(generator())
+
+    module = Module("module", name_dict=dict(BUILT_INS, apply=apply, wait=wait, pause=pause))
+    sandbox = SandBox(Playground(Path(".")))
+    sandbox.call_function(module.add_source_code(SIGNALS))
+
+    signal = sandbox.run(1000)
+    assert isinstance(signal, BlockFunction) and signal.waiter is waiter
+    waiter.set_value("woken")
+
+    signal = sandbox.run(1000)
+    assert isinstance(signal, BlockGenerator)
+    assert next(signal.generator) is None
+    try:
+        next(signal.generator)
+    except StopIteration as stop:
+        sandbox.push(stop.value)
+
+    assert sandbox.run(1000) is DONE and sandbox.done
+    assert module.get_name("result") == [42, "woken", "paused"]